@@ -1,147 +1,435 @@
 import time
 import data_import
 import argparse
+import contextlib
+import datetime
+import io
+import json
 import os
+import platform
+import shutil
+import subprocess
 import sys
+import tempfile
+import tracemalloc
+import numpy as np
+
+
+# base sampling interval (minutes) and id column of every synthetic
+# stream
+STREAMS = {
+    'cgm': (5, 'Id'),
+    'hr': (1, 'patient'),
+    'activity': (1, 'patient'),
+    'bolus': (180, 'Id'),
+    'meal': (240, 'Id'),
+}
+
+_START = datetime.datetime(2018, 3, 12)
+
+
+def _stream_values(kind, rng, n_rows):
+    """
+    synthetic values for one block of a stream, as strings
+    """
+    if kind == 'cgm':
+        # a daily cycle with noise that now and then leaves the
+        # meter range
+        cycle = np.sin(2 * np.pi * rng.random() + np.arange(n_rows) / 46.)
+        glucose = 150 + 90 * cycle + rng.normal(0, 40, n_rows)
+        values = np.clip(glucose, 30, 420).round().astype(np.int64)
+        text = values.astype(str).astype(object)
+        text[values >= 400] = 'high'
+        text[values <= 40] = 'low'
+    elif kind == 'hr':
+        text = rng.integers(50, 180, n_rows).astype(str).astype(object)
+    elif kind == 'activity':
+        counts = rng.poisson(3, n_rows) * (rng.random(n_rows) < 0.3)
+        text = counts.astype(str).astype(object)
+    elif kind == 'bolus':
+        text = rng.uniform(0.1, 15, n_rows).round(1).astype(str)
+        text = text.astype(object)
+    else:
+        text = rng.integers(5, 120, n_rows).astype(str).astype(object)
+    # a few empty fields so the skip rules are exercised
+    text[rng.random(n_rows) < 0.001] = ''
+    return text
+
+
+def generate_stream(kind, n_rows, path, seed=0, block_rows=1000000):
+    """
+    writes a synthetic csv stream shaped like the files in smallData
+
+    Arguments
+    ---------
+    kind : string
+        one of STREAMS
+    n_rows : int
+        number of data rows
+    path : string
+        file to write
+    seed : int
+        random seed, the same seed always gives the same file
+    block_rows : int
+        rows generated and written at a time
+    """
+    if kind not in STREAMS:
+        raise ValueError("generate_stream: unknown stream " + str(kind))
+    interval, id_column = STREAMS[kind]
+    rng = np.random.default_rng(seed)
+    minute = 0
+    with open(path, 'w') as f:
+        f.write(id_column + ',time,value\n')
+        for first in range(0, n_rows, block_rows):
+            count = min(block_rows, n_rows - first)
+            # irregular sampling around the base interval
+            steps = np.maximum(
+                1, interval + rng.integers(-1, 2, count) * (interval > 1))
+            minutes = minute + np.cumsum(steps)
+            minute = int(minutes[-1])
+            times = (np.datetime64(_START, 'm') +
+                     minutes.astype('timedelta64[m]')).astype(object)
+            values = _stream_values(kind, rng, count)
+            lines = []
+            for i in range(count):
+                t = times[i]
+                lines.append('%d,%d/%d/%02d %d:%02d,%s\n' % (
+                    52122 if id_column == 'patient' else first + i + 1,
+                    t.month, t.day, t.year % 100, t.hour, t.minute,
+                    values[i]))
+            f.write(''.join(lines))
+
+
+def generate_folder(folder, n_rows, seed=0):
+    """
+    writes one synthetic file per stream kind into folder, the sparse
+    streams (bolus and meal) get proportionally fewer rows
+
+    Returns
+    -------
+    files : dict
+        stream kind -> path of its csv file
+    """
+    os.makedirs(folder, exist_ok=True)
+    files = {}
+    for i, kind in enumerate(sorted(STREAMS)):
+        rows = n_rows if STREAMS[kind][0] <= 5 else max(1, n_rows // 100)
+        files[kind] = os.path.join(folder, kind + '_synthetic.csv')
+        generate_stream(kind, rows, files[kind], seed + i)
+    return files
+
+
+def _benchmarks(files, work_dir):
+    """
+    the micro-benchmarks, name -> (setup, run) where run(state) is timed
+    """
+    def load_all():
+        # highlow substitution prints one line per entry
+        with contextlib.redirect_stdout(io.StringIO()):
+            return {kind: data_import.ImportData(path,
+                                                 highlow=(kind == 'cgm'))
+                    for kind, path in files.items()}
+
+    def parse(state):
+        data_import.ImportData(files['hr'])
+
+    def parse_chunked(state):
+        for block in data_import.ImportData.iter_chunks(files['hr']):
+            pass
+
+    def round_5(state):
+        data_import.roundTimeArray(state['hr'], 5, 'average')
+
+    def round_multi(state):
+        data_import.roundTimeArrays(state['hr'], [1, 5, 15, 60])
+
+    def round_median(state):
+        data_import.roundTimeArray(state['hr'], 15, 'median')
+
+    def search_hash(state):
+        data = state['hr']
+        data._set_series(data._time_array, data._value_array)
+        data.hash_search_values(state['cgm']._time_array)
+
+    def search_nearest(state):
+        data = state['hr']
+        data._set_series(data._time_array, data._value_array)
+        data.nearest_before_values(state['cgm']._time_array)
+
+    def round_all():
+        # rounded once here so that merge times only alignment and writing
+        state = load_all()
+        kinds = sorted(state)
+        return {'data_list': [data_import.roundTimeArray(state[kind], 5)
+                              for kind in kinds],
+                'names': [files[kind] for kind in kinds]}
+
+    def merge(state):
+        data_import.printArray(state['data_list'], state['names'],
+                               os.path.join(work_dir, 'merge_out.csv'),
+                               'cgm')
+
+    return {
+        'parse': (dict, parse),
+        'parse_chunked': (dict, parse_chunked),
+        'round_5': (load_all, round_5),
+        'round_multi': (load_all, round_multi),
+        'round_median': (load_all, round_median),
+        'search_hash': (load_all, search_hash),
+        'search_nearest': (load_all, search_nearest),
+        'merge': (round_all, merge),
+    }
+
+
+def run_benchmark(setup, run, repeat):
+    """
+    times repeat runs and measures the peak traced memory of one more
+
+    Returns
+    -------
+    result : dict
+        run times in seconds, their percentiles and the peak bytes
+    """
+    state = setup()
+    run(state)  # warm up
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'times': times,
+        'min': float(np.min(times)),
+        'p50': float(np.percentile(times, 50)),
+        'p90': float(np.percentile(times, 90)),
+        'max': float(np.max(times)),
+        'peak_bytes': int(peak),
+    }
+
+
+# interpreter command lines timed by the startup benchmarks
+STARTUP_COMMANDS = {
+    'startup_import': ['-c', 'import data_import'],
+    'startup_cli': ['-m', 'data_import', '--help'],
+}
+
+# allowed median startup time (seconds) on top of a bare interpreter,
+# importing numpy alone takes longer
+STARTUP_TARGET = 0.03
+
+
+def run_startup(args, repeat, work_dir):
+    """
+    times repeat fresh interpreters running args in this folder, the
+    bytecode is cached in work_dir so that the numbers do not depend on
+    whether the checkout is writable
+
+    Returns
+    -------
+    result : dict
+        run times in seconds, their percentiles and the median time
+        over a bare interpreter (overhead)
+    """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=os.path.join(work_dir,
+                                                            'pycache'))
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    folder = os.path.dirname(os.path.abspath(__file__))
+
+    def run(command):
+        subprocess.run([sys.executable] + command, cwd=folder, env=env,
+                       stdout=subprocess.DEVNULL, check=True)
+
+    def timed(command):
+        run(command)  # warm up, writes the bytecode cache
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            run(command)
+            times.append(time.perf_counter() - start)
+        return times
+
+    base = timed(['-c', 'pass'])
+    times = timed(args)
+    return {
+        'times': times,
+        'min': float(np.min(times)),
+        'p50': float(np.percentile(times, 50)),
+        'p90': float(np.percentile(times, 90)),
+        'max': float(np.max(times)),
+        'overhead': float(np.percentile(times, 50) - np.percentile(base, 50)),
+    }
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, cwd=os.path.dirname(
+                os.path.abspath(__file__))).stdout.decode().strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'date': datetime.datetime.now().isoformat(),
+    }
+
+
+def scaling(results):
+    """
+    fits how each benchmark's median time grows with the row count,
+    1.0 is linear, 2.0 quadratic
+
+    Returns
+    -------
+    exponents : dict
+        benchmark name -> exponent between the smallest and largest run
+    """
+    runs = {}
+    for entry in results['results']:
+        runs.setdefault(entry['name'], []).append(
+            (entry['rows'], entry['p50']))
+    exponents = {}
+    for name, points in runs.items():
+        (n0, t0), (n1, t1) = min(points), max(points)
+        if n1 > n0 and t0 > 0 and t1 > 0:
+            exponents[name] = float(np.log(t1 / t0) / np.log(n1 / n0))
+    return exponents
+
+
+def compare(results, baseline, threshold, exponent_slack=0.2):
+    """
+    finds benchmarks whose median time grew by more than threshold, or
+    whose scaling exponent grew by more than exponent_slack
+
+    Returns
+    -------
+    regressions : list of strings
+        one description per regression
+    """
+    old = {(entry['name'], entry['rows']): entry
+           for entry in baseline['results']}
+    regressions = []
+    old_exponents = scaling(baseline)
+    for name, exponent in sorted(scaling(results).items()):
+        if (name in old_exponents and
+                exponent > old_exponents[name] + exponent_slack):
+            regressions.append('%s: scaling n^%.2f -> n^%.2f' % (
+                name, old_exponents[name], exponent))
+    for entry in results['results']:
+        key = (entry['name'], entry['rows'])
+        if key not in old or old[key]['p50'] <= 0:
+            continue
+        ratio = entry['p50'] / old[key]['p50']
+        if ratio > threshold:
+            regressions.append('%s rows=%d: p50 %.4fs -> %.4fs (x%.2f)' % (
+                entry['name'], entry['rows'], old[key]['p50'],
+                entry['p50'], ratio))
+    return regressions
 
 
 if __name__ == "__main__":
 
     # adding arguments
-    parser = argparse.ArgumentParser(description='A class to import,' +
-                                     ' combine, and print data from a folder.',
-                                     prog='dataImport')
+    parser = argparse.ArgumentParser(
+        description='Benchmark the data_import pipeline on synthetic data.',
+        prog='benchmark')
 
-    parser.add_argument('--folder_name', type=str,
-                        help='Name of the folder', required=True)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000],
+                        help='Rows per dense stream, one run per value')
 
-    parser.add_argument('--output_file', type=str,
-                        help='Name of Output file', required=True)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per benchmark')
 
-    parser.add_argument('--sort_key', type=str,
-                        help='File to sort on', required=True)
+    parser.add_argument('--benchmarks', type=str, nargs='+',
+                        help='Subset of benchmarks to run')
 
-    args = parser.parse_args()
+    parser.add_argument('--output', type=str,
+                        help='JSON file the results are written to')
 
-    if '.csv' in args.output_file:
-        args.output_file = args.output_file.split('.csv')[0]
+    parser.add_argument('--compare', type=str,
+                        help='JSON results of an earlier run to compare to')
 
-    # pull all the folders in the file
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Allowed slowdown ratio before a benchmark ' +
+                        'counts as a regression')
 
-    files_lst = []  # list the folders
-    try:
-        csv_files = os.listdir(args.folder_name)
-    except FileNotFoundError:
-        print("folder_name provided was not found!", file=sys.stderr)
+    parser.add_argument('--work_dir', type=str,
+                        help='Folder for the synthetic data (kept)')
+
+    parser.add_argument('--startup_target', type=float,
+                        default=STARTUP_TARGET,
+                        help='Allowed startup time in seconds on top of ' +
+                        'a bare interpreter')
+
+    args = parser.parse_args()
+
+    if args.repeat <= 0:
+        print("repeat must be a positive number!", file=sys.stderr)
         sys.exit(1)
-    for csv_file in csv_files:
-        files_lst.append(os.path.join(args.folder_name, csv_file))
-
-    # import all the files into a list of ImportData objects (in a loop!)
-    data_lst = []
-    for file_name in files_lst:
-        if 'cgm' in file_name:
-            data_lst.append(data_import.ImportData(file_name, highlow=True))
-        else:
-            data_lst.append(data_import.ImportData(file_name))
-
-    # create two new lists of zip objects
-    # do this in a loop, where you loop through the data_lst
-
-    data_5 = []  # a list with time rounded to 5min
-    data_15 = []  # a list with time rounded to 15min
-
-    # Linear Search (linear search is default)
-
-    t1 = time.time()
-    for data_import_obj in data_lst:
-        sum_key = [
-            add_file in data_import_obj._file_name for add_file in
-            ['activity, bolus, meal']
-        ]
-        if any(sum_key):
-            data_5.append(data_import.roundTimeArray(
-                data_import_obj, 5, operation='add'))
-        else:
-            data_5.append(data_import.roundTimeArray(data_import_obj, 5))
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='benchmark_')
+    results = {'meta': _metadata(), 'results': []}
+    slow_starts = []
     try:
-        data_import.printArray(
-            data_5, files_lst, args.output_file+'_5.csv', args.sort_key)
-    except IndexError:
-        print("sort_key provided was did not apply to the files in " +
-              args.folder_name, file=sys.stderr)
-        sys.exit(1)
+        for name, command in STARTUP_COMMANDS.items():
+            if args.benchmarks is not None and name not in args.benchmarks:
+                continue
+            entry = run_startup(command, args.repeat, work_dir)
+            entry.update({'name': name, 'rows': 0})
+            results['results'].append(entry)
+            print('%-15s p50=%.4fs overhead=%.4fs' % (
+                name, entry['p50'], entry['overhead']))
+            if entry['overhead'] > args.startup_target:
+                slow_starts.append(name)
+        for n_rows in args.rows:
+            folder = os.path.join(work_dir, 'rows_' + str(n_rows))
+            files = generate_folder(folder, n_rows)
+            benchmarks = _benchmarks(files, folder)
+            names = args.benchmarks or list(benchmarks)
+            for name in names:
+                if name in STARTUP_COMMANDS:
+                    continue
+                if name not in benchmarks:
+                    print("unknown benchmark " + name, file=sys.stderr)
+                    sys.exit(1)
+                setup, run = benchmarks[name]
+                entry = run_benchmark(setup, run, args.repeat)
+                entry.update({'name': name, 'rows': n_rows})
+                results['results'].append(entry)
+                print('%-15s rows=%-10d p50=%.4fs p90=%.4fs '
+                      'peak=%.1fMB' % (name, n_rows, entry['p50'],
+                                       entry['p90'],
+                                       entry['peak_bytes'] / 2**20))
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
 
-    t2 = time.time()
-
-    for data_import_obj in data_lst:
-        sum_key = [
-            add_file in data_import_obj._file_name for add_file in
-            ['activity, bolus, meal']
-        ]
-        if any(sum_key):
-            data_15.append(data_import.roundTimeArray(
-                data_import_obj, 15, operation='add'))
-        else:
-            data_15.append(data_import.roundTimeArray(data_import_obj, 15))
-    try:
-        data_import.printArray(data_15, files_lst, args.output_file +
-                               '_15.csv', args.sort_key)
-    except IndexError:
-        print("sort_key provided did not apply to the files in " +
-              args.folder_name, file=sys.stderr)
-        sys.exit(1)
+    results['scaling'] = scaling(results)
+    for name, exponent in sorted(results['scaling'].items()):
+        print('%-15s scales as n^%.2f' % (name, exponent))
 
-    t3 = time.time()
-
-    # reinitialize arrays
-
-    data_5 = []  # a list with time rounded to 5min
-    data_15 = []  # a list with time rounded to 15min
-
-    t4 = time.time()
-    for data_import_obj in data_lst:
-        sum_key = [
-            add_file in data_import_obj._file_name for add_file in
-            ['activity, bolus, meal']
-        ]
-        if any(sum_key):
-            data_5.append(data_import.roundTimeArray(
-                data_import_obj, 5, operation='add', search_type="binary"))
-        else:
-            data_5.append(data_import.roundTimeArray(
-                data_import_obj, 5, search_type="binary"))
-    try:
-        data_import.printArray(
-            data_5, files_lst, args.output_file+'_5.csv', args.sort_key)
-    except IndexError:
-        print("sort_key provided was did not apply to the files in " +
-              args.folder_name, file=sys.stderr)
-        sys.exit(1)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
 
-    t5 = time.time()
-
-    for data_import_obj in data_lst:
-        sum_key = [
-            add_file in data_import_obj._file_name for add_file in
-            ['activity, bolus, meal']
-        ]
-        if any(sum_key):
-            data_15.append(data_import.roundTimeArray(
-                data_import_obj, 15, operation='add', search_type="binary"))
-        else:
-            data_15.append(data_import.roundTimeArray(
-                data_import_obj, 15, search_type="binary"))
-    try:
-        data_import.printArray(data_15, files_lst, args.output_file +
-                               '_15.csv', args.sort_key)
-    except IndexError:
-        print("sort_key provided did not apply to the files in " +
-              args.folder_name, file=sys.stderr)
-        sys.exit(1)
-    t6 = time.time()
+    for name in slow_starts:
+        print('SLOW STARTUP %s: more than %.4fs over a bare interpreter' % (
+            name, args.startup_target), file=sys.stderr)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
 
-    print("time for data_out_5 linear search:", t2 - t1)
-    print("time for data_out_15 linear search:", t3 - t2)
-    print("time for data_out_5 binary search:", t5 - t4)
-    print("time for data_out_15 binary search:", t6 - t5)
+    if slow_starts:
+        sys.exit(1)
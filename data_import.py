@@ -1,11 +1,899 @@
-import csv
-import dateutil.parser
-import copy
 import os
-import argparse
+import re
+import collections
+import contextlib
 import datetime
-import numpy as np
+import functools
+import importlib
+import io
+import itertools
 import sys
+import time
+from collections.abc import Sequence
+
+
+class _LazyModule:
+    """
+    stands in for a module until one of its attributes is used, then
+    imports it and replaces itself in this module's globals
+
+    numpy takes longer to import than a small folder takes to process,
+    so it is only loaded by the code paths that need it, never for
+    --help or a rejected command line.
+    """
+    __slots__ = ('_name', '_alias')
+
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return '<lazy module ' + repr(self._name) + '>'
+
+
+np = _LazyModule('numpy', 'np')
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_ONE_SECOND = datetime.timedelta(seconds=1)
+
+
+def _to_seconds(time):
+    """
+    converts a datetime.datetime into integer seconds since the epoch,
+    timezone aware values are converted to naive UTC first
+    """
+    if time.tzinfo is not None:
+        time = time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (time - _EPOCH) // _ONE_SECOND
+
+
+def _to_datetime64(key_time):
+    """
+    converts a datetime.datetime key into a datetime64[s] scalar
+    """
+    return np.int64(_to_seconds(key_time)).astype('datetime64[s]')
+
+
+# candidate layouts tried (in order) when a file's time format is detected
+_TIME_FORMATS = (
+    '%m/%d/%y %H:%M',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%y %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M',
+)
+
+_TIME_DIRECTIVES = {
+    'Y': r'\d{4}',
+    'y': r'\d{2}',
+    'm': r'\d{1,2}',
+    'd': r'\d{1,2}',
+    'H': r'\d{1,2}',
+    'M': r'\d{1,2}',
+    'S': r'\d{1,2}',
+}
+
+
+class PipelineStats:
+    """
+    Per-stage timings and counters of the import pipeline
+
+    Pass one object as the stats argument of ImportData, roundTimeArray,
+    roundTimeArrays, printArray or importFolder and it accumulates over
+    every call. Without a stats object the pipeline only pays for an
+    `is None` check per stage.
+
+    Attributes
+    ----------
+    timings : dict
+        stage name -> total seconds spent in it ('read', 'parse_time',
+        'parse_value', 'sort', 'round', 'align', 'write')
+    calls : dict
+        stage name -> number of times it ran
+    counts : dict
+        counter name -> total, see COUNTERS
+    callback : callable
+        optional, called as callback(stage, seconds) after every stage
+    """
+    COUNTERS = ('rows_parsed', 'rows_empty', 'bad_time', 'bad_value',
+                'high_substituted', 'low_substituted', 'rows_written',
+                'bytes_read', 'bytes_written', 'cache_hits')
+
+    def __init__(self, callback=None):
+        self.timings = {}
+        self.calls = {}
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.callback = callback
+
+    def __getstate__(self):
+        # callbacks stay in the process that created them
+        state = self.__dict__.copy()
+        state['callback'] = None
+        return state
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        context manager timing one run of a stage
+        """
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self.callback is not None:
+                self.callback(name, elapsed)
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def merge(self, other):
+        """
+        adds the timings and counts of another PipelineStats, e.g. one
+        filled in a worker process
+        """
+        for name, seconds in other.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+        for name, calls in other.calls.items():
+            self.calls[name] = self.calls.get(name, 0) + calls
+        for name, total in other.counts.items():
+            self.count(name, total)
+
+    def summary(self):
+        """
+        returns a human readable table of the timings and counts
+        """
+        lines = ['stage          calls    seconds']
+        for name in self.timings:
+            lines.append('%-12s %7d %10.4f' % (
+                name, self.calls[name], self.timings[name]))
+        lines.append('%-12s %7s %10.4f' % (
+            'total', '', sum(self.timings.values())))
+        for name, total in self.counts.items():
+            lines.append('%-16s %d' % (name, total))
+        return '\n'.join(lines)
+
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+def _stage(stats, name):
+    """
+    stats.stage(name), or a shared no-op context when stats is None
+    """
+    if stats is None:
+        return _NO_STAGE
+    return stats.stage(name)
+
+
+class _TimeFormat:
+    """
+    Compiled fixed-layout time format
+
+    Only the numeric strptime directives in _TIME_DIRECTIVES are
+    supported and every pair of fields must be separated by a literal
+    character, which lets whole columns be parsed by replacing the
+    separators with spaces and reading the digits with numpy.
+    """
+
+    def __init__(self, time_format):
+        if not isinstance(time_format, str):
+            raise TypeError("time_format must be a string!")
+        self.time_format = time_format
+        self.fields = []
+        pattern = ''
+        separators = set()
+        last_was_field = False
+        i = 0
+        while i < len(time_format):
+            char = time_format[i]
+            if char == '%':
+                directive = time_format[i+1:i+2]
+                if directive not in _TIME_DIRECTIVES:
+                    raise ValueError(
+                        "time_format: unsupported directive %" + directive)
+                if last_was_field:
+                    raise ValueError(
+                        "time_format: fields must be separated by a literal")
+                if directive in self.fields:
+                    raise ValueError(
+                        "time_format: repeated directive %" + directive)
+                pattern += _TIME_DIRECTIVES[directive]
+                self.fields.append(directive)
+                last_was_field = True
+                i += 2
+            else:
+                if char.isdigit():
+                    raise ValueError(
+                        "time_format: digits can not be used as literals")
+                pattern += re.escape(char)
+                separators.add(char)
+                last_was_field = False
+                i += 1
+        if not ({'Y', 'y'} & set(self.fields)) or \
+                not {'m', 'd'} <= set(self.fields):
+            raise ValueError(
+                "time_format: a year, month and day field are required")
+        self._row_regex = re.compile(pattern)
+        self._block_regex = re.compile(
+            '(?:' + pattern + '\n)*' + pattern)
+        self._table = str.maketrans(
+            ''.join(separators) + '\n', ' ' * (len(separators) + 1))
+
+    def matches(self, time_string):
+        return self._row_regex.fullmatch(time_string) is not None
+
+    def parse(self, time_strings):
+        """
+        parses a list of strings that all match this format
+
+        Returns
+        -------
+        times : numpy.ndarray
+            datetime64[s] array, NaT where a field is out of range
+        """
+        n_fields = len(self.fields)
+        text = '\n'.join(time_strings).translate(self._table)
+        numbers = np.fromstring(text, dtype=np.int64, sep=' ')
+        numbers = numbers.reshape(len(time_strings), n_fields)
+        columns = dict(zip(self.fields, numbers.T))
+        zeros = np.zeros(len(time_strings), dtype=np.int64)
+        if 'Y' in columns:
+            year = columns['Y']
+        else:
+            # same window as dateutil: the year closest to this year,
+            # less than 50 years before or after it
+            this_year = time.localtime().tm_year
+            year = columns['y'] + this_year // 100 * 100
+            year = np.where(year >= this_year + 50, year - 100,
+                            np.where(year < this_year - 50, year + 100, year))
+        month = columns['m']
+        day = columns['d']
+        hour = columns.get('H', zeros)
+        minute = columns.get('M', zeros)
+        second = columns.get('S', zeros)
+        valid = ((month >= 1) & (month <= 12) & (day >= 1) &
+                 (hour < 24) & (minute < 60) & (second < 60))
+        months = np.where(valid, (year - 1970) * 12 + month - 1, 0)
+        month_start = months.astype('datetime64[M]').astype('datetime64[D]')
+        month_end = (months + 1).astype('datetime64[M]').astype(
+            'datetime64[D]')
+        valid &= day <= (month_end - month_start).astype(np.int64)
+        seconds = ((month_start.astype(np.int64) + day - 1) * 86400 +
+                   hour * 3600 + minute * 60 + second)
+        times = seconds.astype('datetime64[s]')
+        times[~valid] = np.datetime64('NaT')
+        return times
+
+    def matches_all(self, time_strings):
+        """
+        checks whether every string matches this format in one regex pass
+        """
+        if len(time_strings) == 0:
+            return True
+        return self._block_regex.fullmatch('\n'.join(time_strings)) \
+            is not None
+
+
+def detectTimeFormat(time_strings, candidates=_TIME_FORMATS):
+    """
+    guesses the fixed layout of a column of time strings
+
+    Arguments
+    ---------
+    time_strings : list of strings
+        column of times, the first non-empty entry is used for detection
+    candidates : list of strings
+        strptime style formats tried in order
+
+    Returns
+    -------
+    time_format : str or None
+        the first candidate matching the sample, None if nothing matched
+    """
+    for sample in time_strings:
+        if sample != '':
+            break
+    else:
+        return None
+    for candidate in candidates:
+        if _TimeFormat(candidate).matches(sample):
+            return candidate
+    return None
+
+
+def parseTimeArray(time_strings, time_format=None):
+    """
+    parses a column of time strings into a datetime64[s] array
+
+    Rows matching the fixed format are converted in a single vectorized
+    pass, the remaining rows fall back to dateutil.parser.parse.
+
+    Arguments
+    ---------
+    time_strings : list of strings
+        time column to be parsed
+    time_format : string
+        strptime style layout (numeric fields only), detected from
+        the first entry when None
+
+    Returns
+    -------
+    times : numpy.ndarray
+        datetime64[s] array with NaT for rows that could not be parsed
+    """
+    if time_format is None:
+        time_format = detectTimeFormat(time_strings)
+    times = np.full(len(time_strings), np.datetime64('NaT'),
+                    dtype='datetime64[s]')
+    if time_format is not None:
+        parser = _TimeFormat(time_format)
+        if parser.matches_all(time_strings):
+            matched = np.ones(len(time_strings), dtype=bool)
+        else:
+            matched = np.fromiter(
+                (parser.matches(time_string) for time_string in time_strings),
+                dtype=bool, count=len(time_strings))
+        fast_index = np.flatnonzero(matched)
+        if len(fast_index) == len(time_strings):
+            fast_strings = time_strings
+        else:
+            fast_strings = [time_strings[i] for i in fast_index]
+        try:
+            times[fast_index] = parser.parse(fast_strings)
+        except ValueError:
+            # embedded newlines etc., let dateutil deal with every row
+            pass
+    unparsed = np.flatnonzero(np.isnat(times))
+    if len(unparsed):
+        # dateutil is only loaded for files the format parser cannot read
+        import dateutil.parser
+    for i in unparsed:
+        try:
+            time = dateutil.parser.parse(time_strings[i])
+            times[i] = np.datetime64(_to_seconds(time), 's')
+        except (ValueError, OverflowError):
+            continue
+    return times
+
+
+def _time_fields(times):
+    """
+    splits a datetime64[s] array into an int64 array per directive
+    of _TIME_DIRECTIVES
+    """
+    days = times.astype('datetime64[D]')
+    months = times.astype('datetime64[M]')
+    years = times.astype('datetime64[Y]')
+    seconds = (times - days).astype(np.int64)
+    year = years.astype(np.int64) + 1970
+    return {
+        'Y': year,
+        'y': year % 100,
+        'm': (months - years).astype(np.int64) + 1,
+        'd': (days - months).astype(np.int64) + 1,
+        'H': seconds // 3600,
+        'M': seconds // 60 % 60,
+        'S': seconds % 60,
+    }
+
+
+def formatTimeArray(times, time_format=None):
+    """
+    formats a datetime64 array as strings, the inverse of parseTimeArray
+
+    Arguments
+    ---------
+    times : numpy.ndarray
+        datetime64 array to be formatted
+    time_format : string
+        strptime style layout using the directives parseTimeArray
+        supports, every field is zero padded, None gives the
+        'YYYY-MM-DD HH:MM:SS' layout str() uses for datetime.datetime
+
+    Returns
+    -------
+    time_strings : list of strings
+    """
+    times = np.asarray(times).astype('datetime64[s]')
+    if time_format is None:
+        return [time_string.replace('T', ' ') for time_string in
+                np.datetime_as_string(times, unit='s').tolist()]
+    fields = _TimeFormat(time_format).fields
+    layout = re.sub(r'%([A-Za-z])',
+                    lambda match: '%04d' if match.group(1) == 'Y' else '%02d',
+                    time_format)
+    values = _time_fields(times)
+    columns = [values[field].tolist() for field in fields]
+    return [layout % row for row in zip(*columns)]
+
+
+def _parse_block(time_strings, value_strings, highlow, verbose,
+                 time_format, stats=None):
+    """
+    converts parallel lists of non-empty time and value strings into
+    arrays, applying the ImportData skip and high/low rules
+
+    Returns
+    -------
+    times : numpy.ndarray
+        datetime64[s] array of the rows that were kept
+    values : numpy.ndarray
+        float64 array of the rows that were kept
+    """
+    times, values, keep = _parse_block_rows(
+        time_strings, value_strings, highlow, verbose, time_format, stats)
+    if keep is None:
+        return times, values
+    return times[keep], values[keep]
+
+
+def _parse_block_rows(time_strings, value_strings, highlow, verbose,
+                      time_format, stats=None):
+    """
+    _parse_block without dropping rows, returns the times and values of
+    every row and the mask of rows that were kept (None for all)
+    """
+    with _stage(stats, 'parse_time'):
+        times = parseTimeArray(time_strings, time_format)
+        bad_time = np.isnat(times)
+    with _stage(stats, 'parse_value'):
+        if not bad_time.any():
+            try:
+                values = np.array(value_strings, dtype=np.float64)
+                if stats is not None:
+                    stats.count('rows_parsed', len(values))
+                return times, values, None
+            except ValueError:
+                pass
+        return _parse_rows(times, bad_time, time_strings, value_strings,
+                           highlow, verbose, stats)
+
+
+def _parse_rows(times, bad_time, time_strings, value_strings, highlow,
+                verbose, stats):
+    """
+    row by row part of _parse_block, so messages come out in file order
+    """
+    counts = dict.fromkeys(('bad_time', 'bad_value', 'high_substituted',
+                            'low_substituted'), 0)
+    keep = np.zeros(len(times), dtype=bool)
+    values = np.zeros(len(times), dtype=np.float64)
+    for i in range(len(times)):
+        if bad_time[i]:
+            counts['bad_time'] += 1
+            if verbose:
+                print('Bad input format for time, skipping value')
+                print(time_strings[i])
+            continue
+        if highlow and value_strings[i] == 'high':
+            values[i] = 300.0
+            counts['high_substituted'] += 1
+            print('Changed high entry to 300 at', time_strings[i])
+        elif highlow and value_strings[i] == 'low':
+            values[i] = 40.0
+            counts['low_substituted'] += 1
+            print('Changed low entry to 40 at', time_strings[i])
+        else:
+            try:
+                values[i] = float(value_strings[i])
+            except ValueError:
+                counts['bad_value'] += 1
+                if verbose:
+                    print('Bad input format for value, skipping value')
+                    print(value_strings[i])
+                continue
+        keep[i] = True
+    if stats is not None:
+        for name, total in counts.items():
+            stats.count(name, total)
+        stats.count('rows_parsed', keep.sum())
+    return times, values, keep
+
+
+def _to_datetime64_array(key_times):
+    """
+    converts a list of datetime.datetime (or a datetime64 array)
+    into a datetime64[s] array
+    """
+    if isinstance(key_times, np.ndarray) and \
+            np.issubdtype(key_times.dtype, np.datetime64):
+        return key_times.astype('datetime64[s]')
+    return np.array([_to_seconds(key_time) for key_time in key_times],
+                    dtype=np.int64).astype('datetime64[s]')
+
+
+# rows read from a csv file per parsing block
+_CHUNK_SIZE = 1 << 16
+
+
+def _check_csv(data_csv, time_format):
+    if not isinstance(data_csv, str):
+        raise TypeError("ImportData:", str(data_csv), "is not a string!")
+    if not os.path.isfile(data_csv):
+        raise FileNotFoundError(
+            "ImportData:", data_csv, "is not a valid file!")
+    if time_format is not None:
+        # fail early on formats the fast parser can not handle
+        _TimeFormat(time_format)
+
+
+def _header_columns(header):
+    """
+    returns the (time, value) column indices of a csv header row
+    """
+    if 'time' not in header or 'value' not in header:
+        raise KeyError(
+            "ImportData: the file provided does" +
+            "not have columns for time or value")
+    return header.index('time'), header.index('value')
+
+
+def _select_columns(rows, time_index, value_index, id_index=None):
+    """
+    collects the time and value strings of the rows where both are set,
+    and their id strings as a third list when id_index is given (rows
+    without an id are skipped then)
+    """
+    if id_index is not None:
+        last_index = max(time_index, value_index, id_index)
+        rows = [row for row in rows
+                if len(row) > last_index and row[id_index] != '']
+        time_strings, value_strings = _select_columns(
+            rows, time_index, value_index)
+        id_strings = [row[id_index] for row in rows
+                      if row[value_index] != '' and row[time_index] != '']
+        return time_strings, value_strings, id_strings
+    last_index = max(time_index, value_index)
+    time_strings = []
+    value_strings = []
+    for row in rows:
+        if len(row) <= last_index:
+            continue
+        if row[value_index] == '' or row[time_index] == '':
+            continue
+        time_strings.append(row[time_index])
+        value_strings.append(row[value_index])
+    return time_strings, value_strings
+
+
+def _iter_csv_blocks(data_csv, chunk_size, highlow, verbose, time_format,
+                     stats=None):
+    """
+    reads the time and value columns of a csv file chunk_size rows
+    at a time and yields each block parsed by _parse_block
+    """
+    if stats is not None:
+        stats.count('bytes_read', os.path.getsize(data_csv))
+    with open(data_csv, 'r') as f:
+        yield from _iter_line_blocks(f, chunk_size, highlow, verbose,
+                                     time_format, stats)
+
+
+def _iter_line_blocks(lines, chunk_size, highlow, verbose, time_format,
+                      stats=None):
+    """
+    _iter_csv_blocks for csv text that is already open or in memory
+    """
+    import csv
+    reader = csv.reader(lines)
+    time_index, value_index = _header_columns(next(reader, []))
+    while True:
+        with _stage(stats, 'read'):
+            rows = list(itertools.islice(reader, chunk_size))
+            time_strings, value_strings = _select_columns(
+                rows, time_index, value_index)
+        if len(rows) == 0:
+            return
+        if stats is not None:
+            stats.count('rows_empty', len(rows) - len(time_strings))
+        if len(time_strings) == 0:
+            continue
+        if time_format is None:
+            with _stage(stats, 'parse_time'):
+                time_format = detectTimeFormat(time_strings)
+        yield _parse_block(time_strings, value_strings, highlow,
+                           verbose, time_format, stats)
+
+
+# default size cap of an ImportData parse cache folder
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class _ParseCache:
+    """
+    On-disk cache of parsed time/value arrays
+
+    Every entry is a pair of .npy files named after a hash of the csv
+    path, size, modification time and the parse options, so editing a
+    file or changing an option simply misses the old entry. Entries
+    are loaded memory-mapped and evicted least recently used first.
+    """
+    _VERSION = 1
+    _SUFFIXES = ('.times.npy', '.values.npy')
+
+    def __init__(self, cache_dir, max_bytes=CACHE_MAX_BYTES):
+        if not isinstance(cache_dir, str):
+            raise TypeError("ImportData: cache_dir must be a string!")
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise ValueError(
+                "ImportData: cache_max_bytes must be a non-negative int!")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, data_csv, **options):
+        import hashlib
+        stat = os.stat(data_csv)
+        description = repr((self._VERSION, os.path.abspath(data_csv),
+                            stat.st_size, stat.st_mtime_ns,
+                            sorted(options.items())))
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        return [os.path.join(self.cache_dir, key + suffix)
+                for suffix in self._SUFFIXES]
+
+    def load(self, key):
+        """
+        returns the memory-mapped (times, values) of an entry, or None
+        """
+        paths = self._paths(key)
+        try:
+            times = np.load(paths[0], mmap_mode='r')
+            values = np.load(paths[1], mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if times.dtype != np.dtype('datetime64[s]') or \
+                values.dtype != np.float64 or times.shape != values.shape:
+            return None
+        for path in paths:
+            # the modification time doubles as the last use for eviction
+            os.utime(path)
+        return times, values
+
+    def store(self, key, times, values):
+        for path, data in zip(self._paths(key), (times, values)):
+            temp_path = path + '.' + str(os.getpid()) + '.tmp'
+            with open(temp_path, 'wb') as f:
+                np.save(f, data)
+            os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        removes least recently used entries until the folder fits
+        """
+        entries = {}
+        for file_name in os.listdir(self.cache_dir):
+            for suffix in self._SUFFIXES:
+                if file_name.endswith(suffix):
+                    path = os.path.join(self.cache_dir, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    key = file_name[:-len(suffix)]
+                    size, used = entries.get(key, (0, 0))
+                    entries[key] = (size + stat.st_size,
+                                    max(used, stat.st_mtime))
+        total = sum(size for size, used in entries.values())
+        for key in sorted(entries, key=lambda key: entries[key][1]):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= entries[key][0]
+
+
+class _ArrayView(Sequence):
+    """
+    Read-only list-like view of a numpy array
+
+    Elements are boxed into python objects (datetime.datetime, float)
+    only when they are accessed, so existing callers that index or
+    iterate over ImportData._time and ImportData._value keep working
+    while the data itself stays in a contiguous buffer.
+    """
+    __slots__ = ('_array',)
+
+    def __init__(self, values):
+        self._array = values
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._array[index].tolist()
+        return self._array[index].item()
+
+    def __iter__(self):
+        return iter(self._array.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self._array, dtype=dtype)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, _ArrayView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def copy(self):
+        return list(self)
+
+
+class TimeSeries(Sequence):
+    """
+    Compact (time, value) series returned by roundTimeArray
+
+    The series is held as a datetime64[s] and a float64 array, 16 bytes
+    per sample, and rows are only boxed into (datetime.datetime, float)
+    pairs while they are iterated or indexed. Unlike the zip objects it
+    replaces it can be iterated any number of times and sliced.
+
+    Attributes
+    ----------
+    times : numpy.ndarray
+        datetime64[s] array of the times
+    values : numpy.ndarray
+        float64 array of the values
+    """
+    __slots__ = ('times', 'values')
+
+    # rows boxed at a time while iterating
+    _BLOCK_ROWS = 4096
+
+    def __init__(self, times, values):
+        times = np.asarray(times)
+        if not np.issubdtype(times.dtype, np.datetime64):
+            times = _to_datetime64_array(times)
+        self.times = times.astype('datetime64[s]', copy=False)
+        self.values = np.asarray(values, dtype=np.float64)
+        if self.times.ndim != 1 or self.times.shape != self.values.shape:
+            raise ValueError("TimeSeries: times and values must be " +
+                             "1-d arrays of the same length!")
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TimeSeries(self.times[index], self.values[index])
+        return self.times[index].item(), self.values[index].item()
+
+    def __iter__(self):
+        for start in range(0, len(self.times), self._BLOCK_ROWS):
+            stop = start + self._BLOCK_ROWS
+            yield from zip(self.times[start:stop].tolist(),
+                           self.values[start:stop].tolist())
+
+    def __eq__(self, other):
+        if isinstance(other, TimeSeries):
+            return np.array_equal(self.times, other.times) and \
+                np.array_equal(self.values, other.values, equal_nan=True)
+        return NotImplemented
+
+    def __repr__(self):
+        return 'TimeSeries(' + str(len(self)) + ' rows)'
+
+
+class _Groups:
+    """
+    Sort-and-segment grouping of rows sharing a key
+
+    Attributes
+    ----------
+    order : numpy.ndarray
+        stable argsort of the keys, rows of a group are contiguous and
+        keep their original relative order
+    keys : numpy.ndarray
+        sorted unique keys
+    starts : numpy.ndarray
+        index into order where each group starts
+    counts : numpy.ndarray
+        number of rows in each group
+    appearance : numpy.ndarray
+        group indices ordered by the first row of each group
+    """
+
+    def __init__(self, keys):
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        boundary = np.empty(len(sorted_keys), dtype=bool)
+        boundary[:1] = True
+        np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=boundary[1:])
+        self.starts = np.flatnonzero(boundary)
+        self.keys = sorted_keys[self.starts]
+        self.counts = np.diff(np.append(self.starts, len(sorted_keys)))
+        self.appearance = np.argsort(self.order[self.starts], kind='stable')
+
+    def __len__(self):
+        return len(self.starts)
+
+    def reduce(self, ufunc, sorted_values):
+        """
+        applies ufunc.reduceat over each group of values sorted by order
+        """
+        if len(self.starts) == 0:
+            return np.zeros(0, dtype=np.float64)
+        return ufunc.reduceat(sorted_values, self.starts)
+
+
+class _TimeIndex:
+    """
+    Hash index from timestamp to the rows holding it
+
+    Built from a _Groups of the int64 seconds, the dict maps each
+    distinct second to its group so exact lookups are O(1).
+    """
+
+    def __init__(self, times):
+        self.groups = _Groups(times.astype(np.int64))
+        self.lookup = dict(zip(self.groups.keys.tolist(),
+                               range(len(self.groups))))
+
+    def positions(self, group):
+        """
+        row positions (in file order) of a group, empty for group -1
+        """
+        if group < 0:
+            return np.zeros(0, dtype=np.intp)
+        start = self.groups.starts[group]
+        return self.groups.order[start:start + self.groups.counts[group]]
+
+    def find(self, seconds):
+        return self.lookup.get(seconds, -1)
+
+    def find_many(self, seconds):
+        return np.fromiter((self.lookup.get(key, -1) for key in seconds),
+                           dtype=np.intp, count=len(seconds))
+
+
+class _SortedIndex:
+    """
+    Time ordered view of a series used by the bisection based queries
+
+    Attributes
+    ----------
+    order : numpy.ndarray or None
+        stable argsort of the times, None when they are already sorted
+    times : numpy.ndarray
+        the times in ascending order
+    """
+
+    def __init__(self, times):
+        if np.all(times[1:] >= times[:-1]):
+            self.order = None
+            self.times = times
+        else:
+            self.order = np.argsort(times, kind='stable')
+            self.times = times[self.order]
+
+    def rows(self, positions):
+        """
+        maps positions in the sorted times back to rows of the series
+        """
+        if self.order is None:
+            return positions
+        return self.order[positions]
 
 
 class ImportData:
@@ -14,10 +902,14 @@ class ImportData:
 
     Attributes
     ----------
-    _time : array
-        array of time values from csv used to generate object
-    _value : array
-        array of values from csv used to generate object
+    _time_array : numpy.ndarray
+        datetime64[s] array of time values from csv used to generate object
+    _value_array : numpy.ndarray
+        float64 array of values from csv used to generate object
+    _time : sequence
+        read-only list view of _time_array as datetime.datetime objects
+    _value : sequence
+        read-only list view of _value_array as floats
 
     Methods
     -------
@@ -25,13 +917,23 @@ class ImportData:
         constructor method for ImportData
     linear_search_value(key_time)
         linearly search for value given a datetime key
+    hash_search_value(key_time)
+        hash index lookup for value given a datetime key
+    hash_search_values(key_times)
+        hash index lookup for many datetime keys at once
     binary_search_value(key_time)
         binary search for value given a datetime key
+    range_search_value(start_time, end_time)
+        all measurements in a time window
+    nearest_before_value(key_time) / nearest_after_value(key_time)
+        closest measurement at or before / after a datetime key
     """
     # open file, create a reader from csv.DictReader,
     # and read input times and values
 
-    def __init__(self, data_csv, highlow=False, verbose=False):
+    def __init__(self, data_csv, highlow=False, verbose=False,
+                 time_format=None, cache_dir=None,
+                 cache_max_bytes=CACHE_MAX_BYTES, stats=None):
         """
         constructor method for ImportData
 
@@ -43,246 +945,2378 @@ class ImportData:
             a flag used for checking to replace high/low values with 300/40
         verbise : bool
             a flag used for outputting various error output
+        time_format : string
+            strptime style layout of the time column (e.g. '%m/%d/%y %H:%M'),
+            detected once from the first row of the file when None
+        cache_dir : string
+            folder of a binary cache of parsed files, when given an
+            unchanged file is memory-mapped from the cache instead of
+            being parsed again (parse messages are not repeated then)
+        cache_max_bytes : int
+            size cap of cache_dir, least recently used entries are
+            evicted once it is exceeded
+        stats : PipelineStats
+            optional, collects read and parse timings and row counts
         """
-        if not isinstance(data_csv, str):
-            raise TypeError("ImportData:", str(data_csv), "is not a string!")
-        if not os.path.isfile(data_csv):
-            raise FileNotFoundError(
-                "ImportData:", data_csv, "is not a valid file!")
-        self._time = []
-        self._value = []
+        _check_csv(data_csv, time_format)
         self._file_name = data_csv
+        self._options = (highlow, verbose, time_format)
+
+        cache = None
+        if cache_dir is not None:
+            cache = _ParseCache(cache_dir, cache_max_bytes)
+            key = cache.key(data_csv, highlow=highlow,
+                            time_format=time_format)
+            cached = cache.load(key)
+            if cached is not None:
+                self._set_series(*cached)
+                self._scan_tail(os.path.getsize(data_csv))
+                if stats is not None:
+                    stats.count('cache_hits')
+                return
+
+        times = []
+        values = []
+        with open(data_csv, 'r') as f:
+            for time_block, value_block in _iter_line_blocks(
+                    f, _CHUNK_SIZE, highlow, verbose, time_format, stats):
+                times.append(time_block)
+                values.append(value_block)
+            # bytes parsed, the file may have grown since it was opened
+            size = f.buffer.tell()
+        if stats is not None:
+            stats.count('bytes_read', size)
+        self._scan_tail(size)
+        if len(times) == 1:
+            self._set_series(times[0], values[0])
+        else:
+            self._set_series(
+                np.concatenate(times or [np.zeros(0, 'datetime64[s]')]),
+                np.concatenate(values or [np.zeros(0)]))
+        if cache is not None:
+            cache.store(key, self._time_array, self._value_array)
+
+    @classmethod
+    def from_arrays(cls, times, values, file_name=''):
+        """
+        builds an ImportData object from times and values that are
+        already in memory instead of reading a csv file
+
+        Arguments
+        ---------
+        times : list of datetime.datetime or numpy.ndarray
+            measurement times
+        values : array like
+            measurement values
+        file_name : string
+            name recorded as the source of the data
+
+        Returns
+        -------
+        data : ImportData
+        """
+        data = cls.__new__(cls)
+        data._file_name = file_name
+        data._options = (False, False, None)
+        data._file_offset = 0
+        data._tail = None
+        data._set_series(_to_datetime64_array(times), values)
+        return data
+
+    @staticmethod
+    def iter_chunks(data_csv, chunk_size=_CHUNK_SIZE, highlow=False,
+                    verbose=False, time_format=None, stats=None):
+        """
+        streams a csv file as parsed blocks of at most chunk_size rows,
+        so memory stays bounded by the chunk size instead of the file size
+
+        The skip and high/low rules are the same as in the constructor
+        and the time format is detected once, from the first block.
+
+        Arguments
+        ---------
+        data_csv : string
+            name of csv file to be read in
+        chunk_size : int
+            number of csv rows read per block
+        highlow, verbose, time_format, stats :
+            see ImportData.__init__
+
+        Returns
+        -------
+        chunks : generator
+            yields (times, values) datetime64[s] and float64 arrays
+        """
+        _check_csv(data_csv, time_format)
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError(
+                "ImportData.iter_chunks: chunk_size must be a positive int!")
+        return _iter_csv_blocks(data_csv, chunk_size, highlow, verbose,
+                                time_format, stats)
+
+    def __copy__(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        # appends to the clone must not write into our spare capacity
+        clone._buffers = None
+        return clone
+
+    def __deepcopy__(self, memo):
+        # the read-only arrays and lazy indexes are shared, not copied
+        return self.__copy__()
+
+    def append(self, times, values):
+        """
+        appends new measurements to the end of the series
+
+        The arrays grow geometrically, so appending k rows costs O(k)
+        amortized rather than a copy of the whole history.
+
+        Arguments
+        ---------
+        times : list of datetime.datetime or numpy.ndarray
+            times of the new rows
+        values : array like
+            values of the new rows
+        """
+        times = _to_datetime64_array(times)
+        values = np.asarray(values, dtype=np.float64)
+        if times.shape != values.shape:
+            raise ValueError(
+                "ImportData: time and value arrays must be the same length")
+        n_old = len(self._time_array)
+        n_new = n_old + len(times)
+        buffers = self._buffers
+        if buffers is None or len(buffers[0]) < n_new:
+            capacity = max(2 * n_new, 1024)
+            buffers = (np.empty(capacity, dtype='datetime64[s]'),
+                       np.empty(capacity, dtype=np.float64))
+            buffers[0][:n_old] = self._time_array
+            buffers[1][:n_old] = self._value_array
+        buffers[0][n_old:n_new] = times
+        buffers[1][n_old:n_new] = values
+        self._set_series(buffers[0][:n_new], buffers[1][:n_new])
+        self._buffers = buffers
+
+    def _scan_tail(self, size):
+        """
+        sets _file_offset to the end of the last complete line in the
+        first size bytes of the source file
+
+        A last line without a newline may still be being written. The
+        constructor keeps its rows like those of any other line, they
+        are remembered in _tail so that append_csv can replace them
+        once the line is complete.
+        """
+        highlow, verbose, time_format = self._options
+        with open(self._file_name, 'rb') as f:
+            end = size
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            f.seek(end)
+            tail = f.read(size - end)
+            f.seek(0)
+            header = f.readline()
+        self._file_offset = end
+        self._tail = None
+        if end == 0 or tail.strip() == b'':
+            return
+        # the messages of these rows were printed by the first parse
+        with contextlib.redirect_stdout(io.StringIO()):
+            blocks = list(_iter_line_blocks(
+                [header.decode('utf-8'), tail.decode('utf-8', 'replace')],
+                _CHUNK_SIZE, highlow, False, time_format))
+        if len(blocks) > 0 and len(blocks[0][0]) > 0:
+            self._tail = blocks[0]
+
+    def _complete_rows(self):
+        """
+        mask of the rows that do not come from an incomplete last line,
+        None when there is no such line
+        """
+        if self._tail is None:
+            return None
+        keep = np.ones(len(self._time_array), dtype=bool)
+        for time, value in zip(*self._tail):
+            same = (self._value_array == value) | \
+                (np.isnan(self._value_array) & np.isnan(value))
+            match = np.flatnonzero(keep & same &
+                                   (self._time_array == time))
+            if len(match) > 0:
+                keep[match[-1]] = False
+        return keep
+
+    def _complete_series(self):
+        """
+        times and values without the rows _scan_tail kept from an
+        incomplete last line, the rows append_csv will not retract
+        """
+        keep = self._complete_rows()
+        if keep is None:
+            return self._time_array, self._value_array
+        return self._time_array[keep], self._value_array[keep]
+
+    def _drop_tail(self):
+        """
+        removes the rows _scan_tail kept from an incomplete last line
+        """
+        if self._tail is None:
+            return
+        self._set_series(*self._complete_series())
+        self._tail = None
+
+    def append_csv(self):
+        """
+        reads the complete rows added to the source csv file since it
+        was last read and appends them, using the constructor's options
+
+        Rows the constructor read from a last line that had no newline
+        yet are replaced by the rows of the completed line.
+
+        Returns
+        -------
+        times : numpy.ndarray
+            datetime64[s] times of the new rows
+        values : numpy.ndarray
+            float64 values of the new rows
+        """
+        import csv
+        highlow, verbose, time_format = self._options
+        with open(self._file_name, 'rb') as f:
+            header = next(csv.reader([f.readline().decode('utf-8')]), [])
+            f.seek(self._file_offset)
+            data = f.read()
+        # a trailing partial line is left for the next call
+        end = data.rfind(b'\n') + 1
+        self._file_offset += end
+        if end > 0:
+            self._drop_tail()
+        time_strings, value_strings = _select_columns(
+            csv.reader(data[:end].decode('utf-8').splitlines()),
+            *_header_columns(header))
+        if len(time_strings) == 0:
+            return (np.zeros(0, dtype='datetime64[s]'),
+                    np.zeros(0, dtype=np.float64))
+        times, values = _parse_block(time_strings, value_strings, highlow,
+                                     verbose, time_format)
+        self.append(times, values)
+        return times, values
+
+    @property
+    def _time(self):
+        return _ArrayView(self._time_array)
+
+    @property
+    def _value(self):
+        return _ArrayView(self._value_array)
+
+    def _set_series(self, times, values):
+        """
+        replaces the stored series, all mutations of the
+        time and value arrays should go through this method
+
+        Arguments
+        ---------
+        times : array like
+            new times, converted to datetime64[s]
+        values : array like
+            new values, converted to float64
+        """
+        times = np.asarray(times, dtype='datetime64[s]')
+        values = np.asarray(values, dtype=np.float64)
+        if times.shape != values.shape:
+            raise ValueError(
+                "ImportData: time and value arrays must be the same length")
+        # the arrays are never written in place, mutations replace them,
+        # so copies of this object can share them (copy-on-write)
+        if times.flags.writeable:
+            times = times.view()
+            times.flags.writeable = False
+        if values.flags.writeable:
+            values = values.view()
+            values.flags.writeable = False
+        self._time_array = times
+        self._value_array = values
+        # spare capacity used by append, only valid for these arrays
+        self._buffers = None
+        # derived lookup structures are rebuilt lazily on next use
+        self._hash_index = None
+        self._sorted_index = None
+
+    def _get_sorted_index(self):
+        if self._sorted_index is None:
+            self._sorted_index = _SortedIndex(self._time_array)
+        return self._sorted_index
+
+    def _get_hash_index(self):
+        if self._hash_index is None:
+            self._hash_index = _TimeIndex(self._time_array)
+        return self._hash_index
+
+    def linear_search_value(self, key_time):
+        """
+        performs a linear search on the time array
+        and returns the corresponding value
+
+        Arguments
+        ---------
+        key_time : datetime.datetime
+            a datetime object used to denote the time/date of
+            a measurement was taken
+
+        Returns
+        -------
+        hit_list : array of values corresponding to the specific date/time
+        """
+        # return list of value(s) associated with key_time
+        # if none, return -1 and error message
+        if not isinstance(key_time, datetime.datetime):
+            raise TypeError(
+                "ImportData.linear_search_value : this function only " +
+                "supports datetime.datetime inputs")
+        hits = self._time_array == _to_datetime64(key_time)
+        hit_list = self._value_array[hits].tolist()
+        if len(hit_list) == 0:
+            print("Time Value not in csv")
+            return(-1)
+        else:
+            return(hit_list)
+
+    def hash_search_index(self, key_time):
+        """
+        finds every row recorded at key_time using a hash index
+        that is built on first use and dropped whenever the series changes
+
+        Arguments
+        ---------
+        key_time : datetime.datetime
+            time to look up
+
+        Returns
+        -------
+        positions : numpy.ndarray
+            row positions in file order, empty when there is no match
+        """
+        if not isinstance(key_time, datetime.datetime):
+            raise TypeError(
+                "ImportData.hash_search_index : this function only " +
+                "supports datetime.datetime inputs")
+        index = self._get_hash_index()
+        return index.positions(index.find(_to_seconds(key_time)))
+
+    def hash_search_value(self, key_time):
+        """
+        performs an O(1) hash lookup on the time array
+        and returns the corresponding value
+
+        Arguments
+        ---------
+        key_time : datetime.datetime
+            a datetime object used to denote the time/date of
+            a measurement was taken
+
+        Returns
+        -------
+        hit_list : array of values corresponding to the specific date/time
+        """
+        # return list of value(s) associated with key_time
+        # if none, return -1 and error message
+        hit_list = self._value_array[self.hash_search_index(key_time)].tolist()
+        if len(hit_list) == 0:
+            print("Time Value not in csv")
+            return -1
+        else:
+            return hit_list
+
+    def hash_search_values(self, key_times):
+        """
+        looks up many times at once with the hash index
+
+        Arguments
+        ---------
+        key_times : list of datetime.datetime or numpy.ndarray
+            times to look up, a datetime64 array is used without boxing
+
+        Returns
+        -------
+        hit_lists : list of numpy.ndarray
+            values recorded at each key time, empty arrays for misses
+        """
+        seconds = _to_datetime64_array(key_times).astype(np.int64)
+        index = self._get_hash_index()
+        groups = index.find_many(seconds.tolist())
+        return [self._value_array[index.positions(group)]
+                for group in groups]
+
+    def range_search_value(self, start_time, end_time):
+        """
+        returns every measurement taken in the window
+        start_time <= time < end_time
+
+        Arguments
+        ---------
+        start_time : datetime.datetime
+            inclusive start of the window
+        end_time : datetime.datetime
+            exclusive end of the window
+
+        Returns
+        -------
+        times : numpy.ndarray
+            datetime64[s] times in the window, in time order
+        values : numpy.ndarray
+            float64 values matching times
+        """
+        if not isinstance(start_time, datetime.datetime) or \
+                not isinstance(end_time, datetime.datetime):
+            raise TypeError(
+                "ImportData.range_search_value : this function only " +
+                "supports datetime.datetime inputs")
+        return self.range_search_values([start_time], [end_time])[0]
+
+    def range_search_values(self, start_times, end_times):
+        """
+        batched range_search_value over parallel lists of windows
+
+        Returns
+        -------
+        windows : list of (numpy.ndarray, numpy.ndarray)
+            (times, values) for every window
+        """
+        index = self._get_sorted_index()
+        starts = np.searchsorted(
+            index.times, _to_datetime64_array(start_times), side='left')
+        ends = np.searchsorted(
+            index.times, _to_datetime64_array(end_times), side='left')
+        windows = []
+        for lo, hi in zip(starts.tolist(), ends.tolist()):
+            rows = index.rows(np.arange(lo, max(lo, hi)))
+            windows.append((self._time_array[rows], self._value_array[rows]))
+        return windows
+
+    def _nearest_rows(self, key_times, before, tolerance):
+        """
+        row of the latest time <= key (before) or earliest time >= key
+        (after) for every key, -1 where there is none
+        """
+        index = self._get_sorted_index()
+        keys = _to_datetime64_array(key_times)
+        if before:
+            positions = np.searchsorted(index.times, keys, side='right') - 1
+            found = positions >= 0
+        else:
+            positions = np.searchsorted(index.times, keys, side='left')
+            found = positions < len(index.times)
+        positions = np.where(found, positions, 0)
+        rows = np.where(found, index.rows(positions), -1)
+        if tolerance is not None and len(self._time_array) > 0:
+            limit = np.timedelta64(int(tolerance.total_seconds()), 's')
+            gap = np.abs(self._time_array[np.maximum(rows, 0)] - keys)
+            rows[gap > limit] = -1
+        return rows
+
+    def _nearest_values(self, key_times, before, tolerance):
+        rows = self._nearest_rows(key_times, before, tolerance)
+        missing = rows < 0
+        if len(self._time_array) == 0:
+            return (np.full(len(rows), np.datetime64('NaT'),
+                            dtype='datetime64[s]'),
+                    np.full(len(rows), np.nan))
+        times = self._time_array[np.maximum(rows, 0)]
+        values = self._value_array[np.maximum(rows, 0)]
+        times[missing] = np.datetime64('NaT')
+        values[missing] = np.nan
+        return times, values
+
+    def _nearest_value(self, key_time, before, tolerance):
+        if not isinstance(key_time, datetime.datetime):
+            raise TypeError(
+                "ImportData.nearest_" + ('before' if before else 'after') +
+                "_value : this function only supports datetime.datetime " +
+                "inputs")
+        row = self._nearest_rows([key_time], before, tolerance)[0]
+        if row < 0:
+            return None
+        return (self._time_array[row].item(), self._value_array[row].item())
+
+    def nearest_before_value(self, key_time, tolerance=None):
+        """
+        as-of lookup of the most recent measurement at or before key_time
+
+        Arguments
+        ---------
+        key_time : datetime.datetime
+            time of the query
+        tolerance : datetime.timedelta
+            optional maximum distance between key_time and the match
+
+        Returns
+        -------
+        pair : tuple or None
+            (time, value) of the match, None if there is no match
+        """
+        return self._nearest_value(key_time, True, tolerance)
+
+    def nearest_after_value(self, key_time, tolerance=None):
+        """
+        lookup of the first measurement at or after key_time,
+        see nearest_before_value
+        """
+        return self._nearest_value(key_time, False, tolerance)
+
+    def nearest_before_values(self, key_times, tolerance=None):
+        """
+        batched nearest_before_value
+
+        Arguments
+        ---------
+        key_times : list of datetime.datetime or numpy.ndarray
+            times of the queries
+        tolerance : datetime.timedelta
+            optional maximum distance between a key and its match
+
+        Returns
+        -------
+        times : numpy.ndarray
+            datetime64[s] time of each match, NaT where there is none
+        values : numpy.ndarray
+            value of each match, NaN where there is none
+        """
+        return self._nearest_values(key_times, True, tolerance)
+
+    def nearest_after_values(self, key_times, tolerance=None):
+        """
+        batched nearest_after_value, see nearest_before_values
+        """
+        return self._nearest_values(key_times, False, tolerance)
+
+    def sort_data(self):
+        """
+        sorts list before running a binary search
+        """
+        order = np.argsort(self._time_array, kind='stable')
+        self._set_series(self._time_array[order], self._value_array[order])
+
+    def binary_search_value(self, key_time):
+        """
+        performs a binary search on the time array, through a
+        time ordered index built on first use, and returns the
+        corresponding value
+
+        Arguments
+        ---------
+        key_time : datetime.datetime
+            a datetime object used to denote the time/date of
+            a measurement was taken
+
+        Returns
+        -------
+        hit_list : array of values corresponding to the specific date/time
+        """
+        # return list of value(s) associated with key_time
+        # if none, return -1 and error message
+        index = self._get_sorted_index()
+        key = _to_datetime64(key_time)
+        lo = np.searchsorted(index.times, key, side='left')
+        hi = np.searchsorted(index.times, key, side='right')
+        rows = index.rows(np.arange(lo, hi))
+        hit_list = self._value_array[rows].tolist()
+        if len(hit_list) == 0:
+            print(self._file_name)
+            print("Time Value not in csv")
+            return(-1)
+        else:
+            return(hit_list)
+
+
+class LazyImportData:
+    """
+    Lazily loaded csv time series with a sparse byte-offset index
+
+    The file is memory-mapped and split into blocks of block_rows lines.
+    For every block the index keeps its byte range and its earliest and
+    latest time, so a time range query only parses the blocks that can
+    hold rows in the range. The index is saved next to the file (as
+    <data_csv>.idx.npz) and reused while the file is unchanged.
+    Records are assumed to be one per line (no quoted newlines).
+
+    Attributes
+    ----------
+    starts, ends : numpy.ndarray
+        byte range of each block
+    min_times, max_times : numpy.ndarray
+        datetime64[s] earliest and latest time of each block, NaT for
+        blocks without a valid time
+    """
+    _VERSION = 1
+
+    def __init__(self, data_csv, highlow=False, verbose=False,
+                 time_format=None, block_rows=4096, index_path=None,
+                 persist=True):
+        """
+        opens the file and loads or builds its index
+
+        Arguments
+        ---------
+        data_csv : string
+            name of csv file to be read in
+        highlow, verbose, time_format :
+            see ImportData.__init__
+        block_rows : int
+            lines per index block, smaller blocks mean finer grained
+            (but larger) indexes
+        index_path : string
+            where the index is stored, defaults to data_csv + '.idx.npz'
+        persist : bool
+            whether to save a newly built index
+        """
+        import csv
+        _check_csv(data_csv, time_format)
+        if not isinstance(block_rows, int) or block_rows <= 0:
+            raise ValueError(
+                "LazyImportData: block_rows must be a positive int!")
+        self._file_name = data_csv
+        self._options = (highlow, verbose, time_format)
+        self._block_rows = block_rows
+        if index_path is None:
+            index_path = data_csv + '.idx.npz'
+        self._index_path = index_path
+        stat = os.stat(data_csv)
+        self._signature = np.array(
+            [self._VERSION, stat.st_size, stat.st_mtime_ns, block_rows],
+            dtype=np.int64)
+        with open(data_csv, 'rb') as f:
+            header_line = f.readline()
+        self._header_end = len(header_line)
+        self._columns = _header_columns(
+            next(csv.reader([header_line.decode('utf-8-sig')]), []))
+        if not self._load_index():
+            self._build_index()
+            if persist:
+                self._save_index()
+
+    def _load_index(self):
+        try:
+            with np.load(self._index_path) as index:
+                if not np.array_equal(index['signature'], self._signature):
+                    return False
+                self.starts = index['starts']
+                self.ends = index['ends']
+                self.min_times = index['min_times']
+                self.max_times = index['max_times']
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def _save_index(self):
+        temp_path = self._index_path + '.' + str(os.getpid()) + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, signature=self._signature, starts=self.starts,
+                     ends=self.ends, min_times=self.min_times,
+                     max_times=self.max_times)
+        os.replace(temp_path, self._index_path)
+
+    def _block_ranges(self, mapped, window=1 << 24):
+        """
+        byte ranges of consecutive blocks of block_rows lines, found by
+        scanning the mapped file window by window for newlines
+        """
+        size = len(mapped)
+        buffer = np.frombuffer(mapped, dtype=np.uint8)
+        ranges = []
+        start = self._header_end
+        lines = 0
+        position = self._header_end
+        while position < size:
+            line_ends = np.flatnonzero(
+                buffer[position:position + window] == 10) + position + 1
+            while lines + len(line_ends) >= self._block_rows:
+                end = int(line_ends[self._block_rows - lines - 1])
+                ranges.append((start, end))
+                line_ends = line_ends[self._block_rows - lines:]
+                start = end
+                lines = 0
+            lines += len(line_ends)
+            position += window
+        if start < size:
+            ranges.append((start, size))
+        del buffer
+        return ranges
+
+    def _select_bytes(self, chunk):
+        """
+        time and value strings of the rows in a block, the time format
+        is detected from the first block that has any
+        """
+        import csv
+        highlow, verbose, time_format = self._options
+        time_strings, value_strings = _select_columns(
+            csv.reader(chunk.decode('utf-8').splitlines()), *self._columns)
+        if len(time_strings) > 0 and time_format is None:
+            time_format = detectTimeFormat(time_strings)
+            self._options = (highlow, verbose, time_format)
+        return time_strings, value_strings
+
+    def _parse_bytes(self, chunk):
+        highlow, verbose, time_format = self._options
+        time_strings, value_strings = self._select_bytes(chunk)
+        if len(time_strings) == 0:
+            return (np.zeros(0, dtype='datetime64[s]'),
+                    np.zeros(0, dtype=np.float64))
+        return _parse_block(time_strings, value_strings, highlow, verbose,
+                            self._options[2])
+
+    def _parse_times(self, chunk):
+        """
+        only the times of a block, all the index needs, values and
+        their messages are left to load_range and load
+        """
+        time_strings = self._select_bytes(chunk)[0]
+        times = parseTimeArray(time_strings, self._options[2])
+        return times[~np.isnat(times)]
+
+    def _build_index(self):
+        import mmap
+        starts = []
+        ends = []
+        min_times = []
+        max_times = []
+        with open(self._file_name, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                ranges = []
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    ranges = self._block_ranges(mm)
+                    for start, end in ranges:
+                        times = self._parse_times(mm[start:end])
+                        starts.append(start)
+                        ends.append(end)
+                        if len(times) == 0:
+                            min_times.append(np.datetime64('NaT'))
+                            max_times.append(np.datetime64('NaT'))
+                        else:
+                            min_times.append(times.min())
+                            max_times.append(times.max())
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+        self.min_times = np.array(min_times, dtype='datetime64[s]')
+        self.max_times = np.array(max_times, dtype='datetime64[s]')
+
+    def load_range(self, start_time, end_time):
+        """
+        parses only the blocks that can hold rows with
+        start_time <= time < end_time
+
+        Arguments
+        ---------
+        start_time : datetime.datetime
+            inclusive start of the window
+        end_time : datetime.datetime
+            exclusive end of the window
+
+        Returns
+        -------
+        data : ImportData
+            the rows of the window, in file order
+        """
+        import mmap
+        if not isinstance(start_time, datetime.datetime) or \
+                not isinstance(end_time, datetime.datetime):
+            raise TypeError(
+                "LazyImportData.load_range : this function only " +
+                "supports datetime.datetime inputs")
+        start = _to_datetime64(start_time)
+        end = _to_datetime64(end_time)
+        blocks = np.flatnonzero(
+            (self.max_times >= start) & (self.min_times < end))
+        times = [np.zeros(0, dtype='datetime64[s]')]
+        values = [np.zeros(0, dtype=np.float64)]
+        if len(blocks) > 0:
+            with open(self._file_name, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for block in blocks.tolist():
+                        block_times, block_values = self._parse_bytes(
+                            mm[self.starts[block]:self.ends[block]])
+                        keep = (block_times >= start) & (block_times < end)
+                        times.append(block_times[keep])
+                        values.append(block_values[keep])
+        return ImportData.from_arrays(np.concatenate(times),
+                                      np.concatenate(values),
+                                      file_name=self._file_name)
+
+    def load(self):
+        """
+        parses the whole file
+
+        Returns
+        -------
+        data : ImportData
+        """
+        return ImportData(self._file_name, *self._options)
+
+
+class PartitionedData:
+    """
+    Multi-patient csv time series partitioned by an id column
+
+    The file is read and parsed once. The rows are then sorted by
+    (id, time), so every patient's series is a contiguous, time sorted
+    slice of one pair of arrays. A query looks its patient up in a dict
+    and bisects only that patient's times, so a file with thousands of
+    patients is never scanned again.
+
+    Attributes
+    ----------
+    ids : list of strings
+        patient ids in sorted order
+    times : numpy.ndarray
+        datetime64[s] times of all rows, sorted by id and then time
+    values : numpy.ndarray
+        float64 values in the same order
+    offsets : numpy.ndarray
+        rows offsets[i]:offsets[i+1] belong to ids[i]
+    """
+
+    def __init__(self, data_csv, id_column='patient', highlow=False,
+                 verbose=False, time_format=None):
+        """
+        reads and partitions a csv file
+
+        Arguments
+        ---------
+        data_csv : string
+            name of csv file to be read in
+        id_column : string
+            header of the column rows are partitioned by, rows without
+            an id are skipped
+        highlow, verbose, time_format :
+            see ImportData.__init__
+        """
+        import csv
+        _check_csv(data_csv, time_format)
+        if not isinstance(id_column, str):
+            raise TypeError("PartitionedData: id_column must be a string!")
+        self._file_name = data_csv
+        times = []
+        values = []
+        ids = []
+        # the smallData files start with a byte order mark
+        with open(data_csv, 'r', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if id_column not in header:
+                raise KeyError("PartitionedData: the file provided does " +
+                               "not have a column for " + id_column)
+            time_index, value_index = _header_columns(header)
+            id_index = header.index(id_column)
+            while True:
+                rows = list(itertools.islice(reader, _CHUNK_SIZE))
+                if len(rows) == 0:
+                    break
+                time_strings, value_strings, id_strings = _select_columns(
+                    rows, time_index, value_index, id_index)
+                if len(time_strings) == 0:
+                    continue
+                if time_format is None:
+                    time_format = detectTimeFormat(time_strings)
+                block_times, block_values, keep = _parse_block_rows(
+                    time_strings, value_strings, highlow, verbose,
+                    time_format)
+                if keep is not None:
+                    block_times = block_times[keep]
+                    block_values = block_values[keep]
+                    id_strings = [id_strings[i] for i in np.flatnonzero(keep)]
+                times.append(block_times)
+                values.append(block_values)
+                ids.extend(id_strings)
+        times = np.concatenate(times or [np.zeros(0, 'datetime64[s]')])
+        values = np.concatenate(values or [np.zeros(0)])
+        id_names, codes = np.unique(np.array(ids, dtype=str),
+                                    return_inverse=True)
+        order = np.lexsort((times, codes))
+        self._set_partitions(id_names.tolist(), times[order], values[order],
+                             np.searchsorted(codes[order],
+                                             np.arange(len(id_names) + 1)))
+
+    def _set_partitions(self, ids, times, values, offsets):
+        self.ids = ids
+        self.times = times
+        self.values = values
+        self.offsets = offsets
+        self._index = {patient: i for i, patient in enumerate(ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, patient):
+        return str(patient) in self._index
+
+    def _rows(self, patient):
+        try:
+            i = self._index[str(patient)]
+        except KeyError:
+            raise KeyError("PartitionedData: no rows for patient " +
+                           str(patient))
+        return self.offsets[i], self.offsets[i + 1]
+
+    def query(self, patient, start_time=None, end_time=None):
+        """
+        measurements of one patient with start_time <= time < end_time
+
+        Arguments
+        ---------
+        patient : string or int
+            id of the patient
+        start_time, end_time : datetime.datetime
+            window bounds, open ended when None
+
+        Returns
+        -------
+        series : TimeSeries
+            time ordered view of the patient's rows, nothing is copied
+        """
+        first, last = self._rows(patient)
+        times = self.times[first:last]
+        low = 0
+        high = len(times)
+        if start_time is not None:
+            low = np.searchsorted(times, _to_datetime64(start_time), 'left')
+        if end_time is not None:
+            high = np.searchsorted(times, _to_datetime64(end_time), 'left')
+        high = max(low, high)
+        return TimeSeries(times[low:high], self.values[first:last][low:high])
+
+    def series(self, patient):
+        """
+        all rows of one patient as an ImportData object, e.g. for
+        roundTimeArray
+
+        Returns
+        -------
+        data : ImportData
+        """
+        first, last = self._rows(patient)
+        return ImportData.from_arrays(self.times[first:last],
+                                      self.values[first:last],
+                                      self._file_name)
+
+    def save(self, file_name):
+        """
+        writes the partitions to an uncompressed .npz file that load
+        memory-maps, so a server can open large stores without parsing
+        """
+        with open(file_name, 'wb') as f:
+            np.savez(f, ids=np.array(self.ids, dtype=str),
+                     times=self.times, values=self.values,
+                     offsets=self.offsets)
+
+    @classmethod
+    def load(cls, file_name, mmap_mode='r'):
+        """
+        opens a store written by save, the times and values are
+        memory-mapped unless mmap_mode is None
+
+        Returns
+        -------
+        data : PartitionedData
+        """
+        import zipfile
+        data = cls.__new__(cls)
+        data._file_name = file_name
+        if mmap_mode is None:
+            with np.load(file_name) as archive:
+                arrays = {name: archive[name] for name in archive.files}
+        else:
+            arrays = {}
+            with open(file_name, 'rb') as f, zipfile.ZipFile(f) as archive:
+                for info in archive.infolist():
+                    arrays[info.filename[:-len('.npy')]] = _npz_member(
+                        f, info, mmap_mode)
+        data._set_partitions(np.asarray(arrays['ids']).tolist(),
+                             arrays['times'], arrays['values'],
+                             np.asarray(arrays['offsets']))
+        return data
+
+
+def _round_seconds(seconds, res):
+    """
+    rounds epoch seconds to the nearest res minutes of the hour
+
+    The minute of the hour is rounded down when minute % res <= res/2
+    and up otherwise, seconds are carried along unchanged.
+
+    Arguments
+    ---------
+    seconds : numpy.ndarray
+        int64 seconds since the epoch
+    res : int
+        rounding resolution in minutes
+
+    Returns
+    -------
+    rounded : numpy.ndarray
+        int64 seconds since the epoch of each bucket
+    """
+    offset = (seconds // 60) % 60 % res
+    return np.where(offset <= res / 2,
+                    seconds - offset * 60,
+                    seconds + (res - offset) * 60)
+
+
+class Aggregation:
+    """
+    Vectorized reduction applied to every rounded time bucket
+
+    Attributes
+    ----------
+    reduce : callable
+        reduce(values, starts, counts) returning one float per bucket,
+        where values holds the rows grouped bucket by bucket (each bucket
+        keeps its rows in their original order), starts is the index of
+        the first row of each bucket and counts its number of rows
+    partials : tuple of strings or None
+        names from _PARTIALS ('sum', 'count', 'min', 'max') this
+        aggregation can be rebuilt from, None if it needs every row
+    finalize : callable
+        finalize(partials) computing the result from a dict of the
+        partial arrays, required when partials is given
+    """
+
+    def __init__(self, reduce, partials=None, finalize=None):
+        if not callable(reduce):
+            raise TypeError("Aggregation: reduce must be callable!")
+        if partials is not None:
+            partials = tuple(partials)
+            if any(partial not in _PARTIALS for partial in partials):
+                raise ValueError(
+                    "Aggregation: partials must be taken from " +
+                    ', '.join(sorted(_PARTIALS)))
+            if not callable(finalize):
+                raise TypeError(
+                    "Aggregation: finalize must be callable when " +
+                    "partials are given!")
+        self.reduce = reduce
+        self.partials = partials
+        self.finalize = finalize
+
+    @property
+    def decomposable(self):
+        return self.partials is not None
+
+
+def _reduce_sum(values, starts, counts):
+    return np.add.reduceat(values, starts)
+
+
+def _reduce_count(values, starts, counts):
+    return counts.astype(np.float64)
+
+
+def _reduce_min(values, starts, counts):
+    return np.minimum.reduceat(values, starts)
+
+
+def _reduce_max(values, starts, counts):
+    return np.maximum.reduceat(values, starts)
+
+
+def _reduce_first(values, starts, counts):
+    return values[starts]
+
+
+def _reduce_last(values, starts, counts):
+    return values[starts + counts - 1]
+
+
+# partial aggregates that can be merged across blocks or resolutions:
+# name -> (reduction over rows, name of the numpy ufunc combining
+# partial results)
+_PARTIALS = {
+    'sum': (_reduce_sum, 'add'),
+    'count': (_reduce_count, 'add'),
+    'min': (_reduce_min, 'minimum'),
+    'max': (_reduce_max, 'maximum'),
+}
+
+
+def percentileAggregation(q):
+    """
+    builds an Aggregation computing the q-th percentile of each bucket
+    with linear interpolation, the same as numpy.percentile
+
+    Arguments
+    ---------
+    q : float
+        percentile between 0 and 100
+
+    Returns
+    -------
+    aggregation : Aggregation
+    """
+    if not isinstance(q, (int, float)) or not 0 <= q <= 100:
+        raise ValueError("percentileAggregation: q must be in [0, 100]!")
+
+    def reduce(values, starts, counts):
+        # sort the values inside each bucket in one lexsort
+        group = np.repeat(np.arange(len(starts)), counts)
+        ordered = values[np.lexsort((values, group))]
+        position = starts + (counts - 1) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        result = ordered[lower] + \
+            (ordered[upper] - ordered[lower]) * (position - lower)
+        has_nan = np.add.reduceat(np.isnan(values), starts) > 0
+        result[has_nan] = np.nan
+        return result
+
+    return Aggregation(reduce)
+
+
+# registry of the operations understood by the rounding functions,
+# extend it with registerAggregation
+AGGREGATIONS = {}
+
+
+def registerAggregation(name, aggregation):
+    """
+    makes an aggregation available to roundTimeArray and friends by name
+
+    Arguments
+    ---------
+    name : string
+        name passed as the operation argument
+    aggregation : Aggregation
+        the reduction to run on every bucket
+    """
+    if not isinstance(name, str):
+        raise TypeError("registerAggregation: name must be a string!")
+    if not isinstance(aggregation, Aggregation):
+        raise TypeError(
+            "registerAggregation: aggregation must be an Aggregation!")
+    AGGREGATIONS[name] = aggregation
+
+
+registerAggregation('sum', Aggregation(
+    _reduce_sum, ('sum',), lambda partials: partials['sum']))
+registerAggregation('add', AGGREGATIONS['sum'])
+registerAggregation('average', Aggregation(
+    lambda values, starts, counts: _reduce_sum(values, starts, counts) /
+    counts,
+    ('sum', 'count'), lambda partials: partials['sum'] / partials['count']))
+registerAggregation('count', Aggregation(
+    _reduce_count, ('count',), lambda partials: partials['count']))
+registerAggregation('min', Aggregation(
+    _reduce_min, ('min',), lambda partials: partials['min']))
+registerAggregation('max', Aggregation(
+    _reduce_max, ('max',), lambda partials: partials['max']))
+registerAggregation('first', Aggregation(_reduce_first))
+registerAggregation('last', Aggregation(_reduce_last))
+registerAggregation('median', percentileAggregation(50))
+
+_PERCENTILE_NAME = re.compile(r'p(\d+(?:\.\d+)?)')
+
+
+def _get_aggregations(operation, caller):
+    """
+    resolves the operation argument of the rounding functions
+
+    Returns
+    -------
+    aggregations : list of Aggregation
+        one per requested operation
+    single : bool
+        whether a single operation (rather than a list) was requested
+    """
+    single = not isinstance(operation, (list, tuple))
+    operations = [operation] if single else list(operation)
+    if len(operations) == 0:
+        raise ValueError(caller + ": no operation given!")
+    aggregations = []
+    for name in operations:
+        if isinstance(name, Aggregation):
+            aggregations.append(name)
+            continue
+        if not isinstance(name, str):
+            raise TypeError(caller + ": operation was not a string!")
+        if name in AGGREGATIONS:
+            aggregations.append(AGGREGATIONS[name])
+            continue
+        match = _PERCENTILE_NAME.fullmatch(name)
+        if match is not None and float(match.group(1)) <= 100:
+            aggregations.append(percentileAggregation(float(match.group(1))))
+            continue
+        raise NotImplementedError(
+            caller + ": " + name + " not implemented!")
+    return aggregations, single
+
+
+def _rounding_composes(fine, coarse):
+    """
+    checks whether rounding to fine minutes and then to coarse minutes
+    puts every time in the same bucket as rounding straight to coarse
+
+    The rounding rule only looks at the minute of the hour, so checking
+    the 60 minutes of one hour is enough.
+    """
+    seconds = np.arange(60, dtype=np.int64) * 60
+    return np.array_equal(
+        _round_seconds(_round_seconds(seconds, fine), coarse),
+        _round_seconds(seconds, coarse))
+
+
+class _BucketAggregate:
+    """
+    Partial aggregates (see _PARTIALS) of the values in each rounded
+    time bucket
+
+    Blocks of rows are folded in one at a time, so the memory used is
+    bounded by the number of buckets rather than the number of rows.
+
+    Attributes
+    ----------
+    keys : numpy.ndarray
+        sorted int64 bucket times (seconds since the epoch)
+    partials : dict
+        partial name -> float64 array with one entry per bucket
+    first : numpy.ndarray
+        index of the first row (over all blocks) that fell in each bucket
+    rows : int
+        number of rows folded in so far
+    """
+
+    def __init__(self, kinds=('sum', 'count')):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.partials = {kind: np.zeros(0, dtype=np.float64)
+                         for kind in kinds}
+        self.first = np.zeros(0, dtype=np.int64)
+        self.rows = 0
+
+    def add(self, buckets, values):
+        """
+        folds in a block of rows given their bucket and value
+        """
+        groups = _Groups(buckets)
+        if len(groups) == 0:
+            return
+        sorted_values = values[groups.order]
+        partials = {}
+        for kind in self.partials:
+            partials[kind] = _PARTIALS[kind][0](
+                sorted_values, groups.starts, groups.counts)
+        first = self.rows + groups.order[groups.starts]
+        self.rows += len(buckets)
+        self.merge(groups.keys, partials, first)
+
+    def merge(self, keys, partials, first):
+        """
+        folds in already reduced partial aggregates
+        """
+        if len(self.keys) == 0:
+            self.keys, self.partials, self.first = keys, partials, first
+            return
+        if len(keys) > 0 and keys[0] >= self.keys[-1]:
+            # time ordered feeds only touch the last bucket, so combine
+            # that one and extend the arrays instead of re-grouping
+            overlap = int(keys[0] == self.keys[-1])
+            merged = {}
+            for kind in self.partials:
+                combined = self.partials[kind][-1:]
+                if overlap:
+                    combine = getattr(np, _PARTIALS[kind][1])
+                    combined = combine(combined, partials[kind][:1])
+                merged[kind] = np.concatenate([
+                    self.partials[kind][:-1], combined,
+                    partials[kind][overlap:]])
+            self.partials = merged
+            self.first = np.concatenate([
+                self.first[:-1],
+                np.minimum(self.first[-1:], first[:1]) if overlap
+                else self.first[-1:], first[overlap:]])
+            self.keys = np.concatenate([self.keys, keys[overlap:]])
+            return
+        self._combine(
+            np.concatenate([self.keys, keys]),
+            {kind: np.concatenate([self.partials[kind], partials[kind]])
+             for kind in self.partials},
+            np.concatenate([self.first, first]))
+
+    def lookup(self, keys, aggregation):
+        """
+        finished values of the given buckets
+
+        Returns
+        -------
+        values : numpy.ndarray
+            aggregated value of each key, 0 where a key has no bucket
+        found : numpy.ndarray
+            whether each key has a bucket
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.zeros(len(keys)), np.zeros(len(keys), dtype=bool)
+        position = np.minimum(np.searchsorted(self.keys, keys),
+                              len(self.keys) - 1)
+        found = self.keys[position] == keys
+        values = np.asarray(aggregation.finalize(
+            {kind: partial[position]
+             for kind, partial in self.partials.items()}), dtype=np.float64)
+        return np.where(found, values, 0.0), found
+
+    def coarsen(self, res):
+        """
+        re-buckets these partial aggregates at a coarser resolution,
+        only valid when _rounding_composes(fine, res) holds
+
+        Returns
+        -------
+        aggregate : _BucketAggregate
+            the aggregate rounded to res minutes
+        """
+        coarse = _BucketAggregate(self.partials)
+        coarse.rows = self.rows
+        if len(self.keys) > 0:
+            coarse._combine(_round_seconds(self.keys, res), self.partials,
+                            self.first)
+        return coarse
+
+    def _combine(self, keys, partials, first):
+        groups = _Groups(keys)
+        order = groups.order
+        self.partials = {
+            kind: groups.reduce(getattr(np, _PARTIALS[kind][1]),
+                                partials[kind][order])
+            for kind in partials}
+        self.first = groups.reduce(np.minimum, first[order])
+        self.keys = groups.keys
+
+    def result(self, aggregation):
+        """
+        finished buckets in order of first appearance
+
+        Arguments
+        ---------
+        aggregation : Aggregation
+            a decomposable aggregation whose partials were collected
+
+        Returns
+        -------
+        times : numpy.ndarray
+            datetime64[s] bucket times
+        values : numpy.ndarray
+            the aggregated value of each bucket
+        """
+        appearance = np.argsort(self.first, kind='stable')
+        values = np.asarray(aggregation.finalize(self.partials),
+                            dtype=np.float64)
+        return (self.keys[appearance].astype('datetime64[s]'),
+                values[appearance])
+
+
+def _partial_kinds(aggregations):
+    kinds = []
+    for aggregation in aggregations:
+        for kind in aggregation.partials:
+            if kind not in kinds:
+                kinds.append(kind)
+    return kinds
+
+
+def _aggregate_rows(times, values, res, aggregations):
+    """
+    rounds times to res minutes and applies every aggregation
+    to the buckets with a single grouping
+
+    Returns
+    -------
+    new_times : numpy.ndarray
+        datetime64[s] bucket times in order of first appearance
+    new_values : list of numpy.ndarray
+        one array of bucket values per aggregation
+    """
+    groups = _Groups(_round_seconds(times.astype(np.int64), res))
+    new_times = groups.keys[groups.appearance].astype('datetime64[s]')
+    if len(groups) == 0:
+        return new_times, [np.zeros(0) for aggregation in aggregations]
+    sorted_values = values[groups.order]
+    new_values = []
+    for aggregation in aggregations:
+        reduced = np.asarray(
+            aggregation.reduce(sorted_values, groups.starts, groups.counts),
+            dtype=np.float64)
+        new_values.append(reduced[groups.appearance])
+    return new_times, new_values
+
+
+def roundTimeArray(in_obj, res, operation='average',
+                   modify=False, search_type="linear", stats=None):
+    """
+    used to reformat time and value array of an ImportData object
+
+    Arguments
+    ---------
+    in_obj : ImportData
+        an instance of an ImportData object that whos data will be transformed
+    res : int
+        resolution in minutes of the new transformed data
+    operation : string, Aggregation or list of them
+        how value data will be reconsiled for multiple times, any name in
+        AGGREGATIONS ('average', 'sum'/'add', 'count', 'min', 'max',
+        'first', 'last', 'median') or 'p<q>' for the q-th percentile, a
+        list computes every aggregate from the same grouping
+    modify : bool
+        whether this function changes the original ImportData object
+    search_type : string
+        'binary' sorts the data first so the rounded times come out in
+        time order, otherwise they keep their order of first appearance
+    stats : PipelineStats
+        optional, collects the sort and round timings
+
+    Returns
+    -------
+    series : TimeSeries
+        the new times and values, iterating it yields (time, value)
+        pairs, a list of them (one per operation) when a list was given
+
+    """
+    # Inputs: obj (ImportData Object) and res (rounding resoultion)
+    # objective:
+    # create a list of datetime entries and associated values
+    # with the times rounded to the nearest rounding resolution (res)
+    # ensure no duplicated times
+    # handle duplicated values for a single timestamp based on instructions in
+    # the assignment
+    # return: iterable series of the two lists
+    # note: you can create additional variables to help with this task
+    # which are not returned
+    if not isinstance(in_obj, ImportData):
+        raise TypeError(
+            "roundTimeArray: in_obj was not of the class ImportData!")
+    if not isinstance(res, int):
+        raise TypeError("roundTimeArray: res was not an int!")
+    if res <= 0:
+        raise ValueError("roundTimeArray: res must be positive!")
+    aggregations, single = _get_aggregations(operation, "roundTimeArray")
+    if not isinstance(modify, bool):
+        raise TypeError("roundTimeArray: modify must be a bool!")
+    if modify and not single:
+        raise ValueError(
+            "roundTimeArray: modify needs a single operation!")
+    # the source arrays are only read, so nothing needs to be copied
+    times = in_obj._time_array
+    values = in_obj._value_array
+    if search_type == 'binary':
+        with _stage(stats, 'sort'):
+            index = in_obj._get_sorted_index()
+            times = index.times
+            if index.order is not None:
+                values = values[index.order]
+    with _stage(stats, 'round'):
+        new_times, new_values = _aggregate_rows(times, values, res,
+                                                aggregations)
+    if modify:
+        in_obj._set_series(new_times, new_values[0])
+    series = [TimeSeries(new_times, column) for column in new_values]
+    if single:
+        return series[0]
+    return series
+
+
+def roundTimeArrays(in_obj, resolutions, operation='average', stats=None):
+    """
+    rounds an ImportData object at several resolutions in one pass
+
+    For operations that can be rebuilt from partial aggregates (sum,
+    count, min, max and average) the rows are only rounded and grouped
+    once, at the finest resolution. Every coarser level is then built
+    from the partials of a finer level whenever the bucket boundaries
+    line up (e.g. 5 -> 15 -> 60), and from the rows otherwise.
+
+    Arguments
+    ---------
+    in_obj : ImportData
+        an instance of an ImportData object, it is not modified
+    resolutions : list of ints
+        resolutions in minutes of the new transformed data
+    operation : string or Aggregation
+        how values sharing a rounded time are combined, see roundTimeArray
+    stats : PipelineStats
+        optional, collects the round timing
+
+    Returns
+    -------
+    series : list of TimeSeries
+        one series per resolution, each identical to what
+        roundTimeArray(in_obj, res, operation) returns
+    """
+    if not isinstance(in_obj, ImportData):
+        raise TypeError(
+            "roundTimeArrays: in_obj was not of the class ImportData!")
+    if not isinstance(resolutions, (list, tuple)) or \
+            not all(isinstance(res, int) for res in resolutions):
+        raise TypeError("roundTimeArrays: resolutions must be a list of ints!")
+    if any(res <= 0 for res in resolutions):
+        raise ValueError("roundTimeArrays: res must be positive!")
+    if isinstance(operation, (list, tuple)):
+        raise TypeError("roundTimeArrays: operation was not a string!")
+    aggregation = _get_aggregations(operation, "roundTimeArrays")[0][0]
+
+    with _stage(stats, 'round'):
+        results = _round_levels(in_obj._time_array, in_obj._value_array,
+                                resolutions, aggregation)
+    return [TimeSeries(*results[res]) for res in resolutions]
+
+
+def _round_levels(times, values, resolutions, aggregation):
+    """
+    roundTimeArrays without the checks, returns a dict of
+    res -> (times, values) arrays
+    """
+    results = {}
+    if aggregation.decomposable:
+        levels = {}
+        for res in sorted(set(resolutions)):
+            finer = [fine for fine in levels if _rounding_composes(fine, res)]
+            if finer:
+                # fewest partial buckets to re-group
+                levels[res] = levels[max(finer)].coarsen(res)
+            else:
+                levels[res] = _BucketAggregate(
+                    _partial_kinds([aggregation]))
+                levels[res].add(_round_seconds(times.astype(np.int64), res),
+                                values)
+            results[res] = levels[res].result(aggregation)
+    else:
+        for res in set(resolutions):
+            new_times, new_values = _aggregate_rows(times, values, res,
+                                                    [aggregation])
+            results[res] = (new_times, new_values[0])
+    return results
+
+
+def roundTimeChunks(chunks, res, operation='average'):
+    """
+    streaming version of roundTimeArray, rounds and aggregates blocks of
+    rows as they arrive (see ImportData.iter_chunks) while only keeping
+    one set of partial aggregates per bucket in memory
+
+    Arguments
+    ---------
+    chunks : iterable
+        (times, values) blocks of datetime64 and float64 arrays
+    res : int
+        resolution in minutes of the new transformed data
+    operation : string or Aggregation
+        how values sharing a rounded time are combined, only operations
+        built from partial aggregates (sum, count, min, max, average)
+        can be streamed
+
+    Returns
+    -------
+    series : TimeSeries
+        the rounded times and values, in the same order
+        roundTimeArray would produce for the whole file
+    """
+    if not isinstance(res, int):
+        raise TypeError("roundTimeChunks: res was not an int!")
+    if res <= 0:
+        raise ValueError("roundTimeChunks: res must be positive!")
+    if isinstance(operation, (list, tuple)):
+        raise TypeError("roundTimeChunks: operation was not a string!")
+    aggregation = _get_aggregations(operation, "roundTimeChunks")[0][0]
+    if not aggregation.decomposable:
+        raise NotImplementedError(
+            "roundTimeChunks: " + str(operation) +
+            " can not be computed from partial aggregates!")
+    aggregate = _BucketAggregate(_partial_kinds([aggregation]))
+    for times, values in chunks:
+        seconds = np.asarray(times, dtype='datetime64[s]').astype(np.int64)
+        aggregate.add(_round_seconds(seconds, res),
+                      np.asarray(values, dtype=np.float64))
+    times, values = aggregate.result(aggregation)
+    return TimeSeries(times, values)
+
+
+class IncrementalRound:
+    """
+    Rounded aggregate of a series that is kept up to date as rows arrive
+
+    Only the partial aggregates of each bucket are kept, new rows are
+    folded into the trailing buckets they touch, so the cost of an
+    update grows with the number of new rows rather than the history.
+
+    Attributes
+    ----------
+    res : int
+        rounding resolution in minutes
+    """
+
+    def __init__(self, in_obj, res, operation='average'):
+        """
+        Arguments
+        ---------
+        in_obj : ImportData
+            rows received so far, the rows of a last line without a
+            newline are left for append_csv to deliver complete
+        res : int
+            resolution in minutes of the rounded series
+        operation : string or Aggregation
+            a decomposable operation (sum, count, min, max, average)
+        """
+        if not isinstance(in_obj, ImportData):
+            raise TypeError(
+                "IncrementalRound: in_obj was not of the class ImportData!")
+        if not isinstance(res, int):
+            raise TypeError("IncrementalRound: res was not an int!")
+        if res <= 0:
+            raise ValueError("IncrementalRound: res must be positive!")
+        if isinstance(operation, (list, tuple)):
+            raise TypeError("IncrementalRound: operation was not a string!")
+        self._aggregation = _get_aggregations(
+            operation, "IncrementalRound")[0][0]
+        if not self._aggregation.decomposable:
+            raise NotImplementedError(
+                "IncrementalRound: " + str(operation) +
+                " can not be updated incrementally!")
+        self.res = res
+        self._aggregate = _BucketAggregate(
+            _partial_kinds([self._aggregation]))
+        # rows of a line still being written are left out, partial
+        # aggregates can not take them back once append_csv replaces them
+        self.update(*in_obj._complete_series())
+
+    def update(self, times, values):
+        """
+        folds in new rows
+
+        Returns
+        -------
+        changed : numpy.ndarray
+            int64 buckets (seconds since the epoch) whose value changed,
+            in order of first appearance
+        is_new : numpy.ndarray
+            whether each changed bucket did not exist before
+        """
+        seconds = _to_datetime64_array(times).astype(np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        buckets = _round_seconds(seconds, self.res)
+        groups = _Groups(buckets)
+        changed = groups.keys[groups.appearance]
+        is_new = ~self._aggregate.lookup(changed, self._aggregation)[1]
+        self._aggregate.add(buckets, values)
+        return changed, is_new
+
+    def lookup(self, buckets):
+        """
+        current values of the given int64 buckets, see
+        _BucketAggregate.lookup
+        """
+        return self._aggregate.lookup(buckets, self._aggregation)
+
+    def result(self):
+        """
+        the whole rounded series, identical to
+        roundTimeArray(all rows, res, operation)
+
+        Returns
+        -------
+        series : TimeSeries
+            the rounded times and values
+        """
+        times, values = self._aggregate.result(self._aggregation)
+        return TimeSeries(times, values)
+
+
+class GapStats:
+    """
+    Gap statistics of one series on its regular time grid
+
+    Attributes
+    ----------
+    expected : int
+        buckets on the grid from its start to its end
+    observed : int
+        buckets that had a value
+    missing : int
+        buckets without a value, expected - observed
+    gaps : int
+        runs of consecutive missing buckets
+    longest_gap : int
+        length in minutes of the longest run of missing buckets
+    filled : int
+        missing buckets that were given a value by the fill strategy
+    """
+
+    def __init__(self, expected, observed, gaps, longest_gap, filled):
+        self.expected = expected
+        self.observed = observed
+        self.missing = expected - observed
+        self.gaps = gaps
+        self.longest_gap = longest_gap
+        self.filled = filled
+
+    def __repr__(self):
+        return ('GapStats(expected=%d, observed=%d, missing=%d, gaps=%d, '
+                'longest_gap=%d, filled=%d)' % (
+                    self.expected, self.observed, self.missing, self.gaps,
+                    self.longest_gap, self.filled))
+
+
+GAP_STRATEGIES = ('nan', 'ffill', 'linear')
+
+
+def fillGaps(series, res, strategy='nan', max_gap=None, start=None,
+             end=None):
+    """
+    puts a rounded series on a regular res minute grid and fills the
+    missing buckets, in one pass linear in the rows and grid buckets
+
+    Arguments
+    ---------
+    series : TimeSeries or zip
+        output of roundTimeArray at resolution res, a row goes to the
+        grid bucket it falls in, the last row of a bucket wins
+    res : int
+        resolution in minutes of the grid, must divide an hour
+    strategy : string
+        'nan' leaves missing buckets NaN, 'ffill' repeats the last value
+        before the gap and 'linear' interpolates between the values on
+        either side of it
+    max_gap : int
+        gaps longer than this many minutes are left NaN, None fills
+        gaps of any length
+    start, end : datetime.datetime
+        first and last grid time, the first and last time of the series
+        when None, rows outside them are dropped
+
+    Returns
+    -------
+    filled : TimeSeries
+        every grid time from start to end, in time order
+    stats : GapStats
+        gap statistics of the series before filling
+    """
+    if not isinstance(res, int):
+        raise TypeError("fillGaps: res was not an int!")
+    if res <= 0:
+        raise ValueError("fillGaps: res must be positive!")
+    if 60 % res:
+        # rounding restarts every hour, so buckets are only res minutes
+        # apart when res divides an hour
+        raise ValueError("fillGaps: res must divide an hour!")
+    if strategy not in GAP_STRATEGIES:
+        raise ValueError("fillGaps: strategy must be one of " +
+                         ', '.join(GAP_STRATEGIES) + "!")
+    if max_gap is not None and (not isinstance(max_gap, int) or
+                                max_gap < 0):
+        raise ValueError("fillGaps: max_gap must be a non-negative int!")
+    times, values = _series_arrays(series)
+    seconds = times.astype(np.int64)
+    step = res * 60
+    if len(seconds) == 0 and (start is None or end is None):
+        return TimeSeries(times, values), GapStats(0, 0, 0, 0, 0)
+    # rounded times keep their seconds, the grid starts on the minute
+    # and every row goes to the bucket it falls in
+    first = seconds.min() // 60 * 60 if start is None else \
+        _to_seconds(start)
+    last = seconds.max() if end is None else _to_seconds(end)
+    inside = (seconds >= first) & (seconds <= last)
+    buckets = (seconds[inside] - first) // step
+    n = max(0, (last - first) // step + 1)
+    grid = np.full(n, np.nan)
+    observed = np.zeros(n, dtype=bool)
+    grid[buckets] = values[inside]
+    observed[buckets] = True
+
+    # [start, end) of every run of missing buckets
+    edges = np.flatnonzero(np.diff(np.concatenate(
+        ([0], (~observed).view(np.int8), [0]))))
+    lengths = edges[1::2] - edges[::2]
+    fill = ~observed
+    if max_gap is not None:
+        # missing buckets come run after run, in order
+        fill[fill] = np.repeat(lengths * res <= max_gap, lengths)
+    index = np.arange(n)
+    before = np.maximum.accumulate(np.where(observed, index, -1))
+    if strategy == 'ffill':
+        fill &= before >= 0
+        grid[fill] = grid[before[fill]]
+    elif strategy == 'linear':
+        after = np.minimum.accumulate(
+            np.where(observed, index, n)[::-1])[::-1]
+        fill &= (before >= 0) & (after < n)
+        low = before[fill]
+        high = after[fill]
+        weight = (index[fill] - low) / (high - low)
+        grid[fill] = grid[low] + weight * (grid[high] - grid[low])
+    else:
+        fill[:] = False
+    grid_times = (first + index * step).astype('datetime64[s]')
+    stats = GapStats(n, int(observed.sum()), len(lengths),
+                     int(lengths.max()) * res if len(lengths) else 0,
+                     int(fill.sum()))
+    return TimeSeries(grid_times, grid), stats
+
+
+# statistics rollingStats can compute
+ROLLING_STATS = ('mean', 'std', 'min', 'max', 'count', 'time_in_range',
+                 'rate_of_change')
+
+
+def _rolling_extreme(values, left, largest):
+    """
+    min (or max) of the non-NaN values in values[left[i]:i+1] for every
+    i, with a monotonic deque of candidate rows, O(N) as left only grows
+    """
+    values = values.tolist()
+    left = left.tolist()
+    out = [float('nan')] * len(values)
+    window = collections.deque()
+    for i, value in enumerate(values):
+        if value == value:
+            if largest:
+                while window and values[window[-1]] <= value:
+                    window.pop()
+            else:
+                while window and values[window[-1]] >= value:
+                    window.pop()
+            window.append(i)
+        while window and window[0] < left[i]:
+            window.popleft()
+        if window:
+            out[i] = values[window[0]]
+    return np.array(out)
+
+
+def rollingStats(in_obj, windows, stats=('mean', 'std'), low=70.0,
+                 high=180.0):
+    """
+    trailing time window statistics of a series, at every row the rows
+    with time - window < t <= time are summarized
+
+    Sums come from cumulative sums and min/max from a monotonic deque,
+    so every statistic costs O(N) per window after the rows are sorted
+    by time, whatever the window length. NaN values are ignored.
+
+    Arguments
+    ---------
+    in_obj : ImportData, TimeSeries or zip
+        series to summarize, e.g. an output of roundTimeArray
+    windows : int or list of ints
+        window lengths in minutes, a list computes all of them from the
+        same sorted rows and cumulative sums
+    stats : list of strings
+        any of ROLLING_STATS: 'mean', 'std' (population), 'min', 'max',
+        'count', 'time_in_range' (percent of values with
+        low <= value <= high) and 'rate_of_change' (change per minute
+        since the first value in the window)
+    low, high : float
+        target range of 'time_in_range', 70-180 mg/dL by default
+
+    Returns
+    -------
+    results : dict
+        stat name -> TimeSeries over the time sorted rows, or a dict of
+        window -> such a dict when windows is a list
+    """
+    single = isinstance(windows, int)
+    if single:
+        windows = [windows]
+    if not isinstance(windows, (list, tuple)) or \
+            not all(isinstance(window, int) for window in windows):
+        raise TypeError("rollingStats: windows must be an int or a list " +
+                        "of ints!")
+    if any(window <= 0 for window in windows):
+        raise ValueError("rollingStats: windows must be positive!")
+    if isinstance(stats, str) or \
+            not all(stat in ROLLING_STATS for stat in stats):
+        raise ValueError("rollingStats: stats must be a list of " +
+                         ', '.join(ROLLING_STATS) + "!")
+    if isinstance(in_obj, ImportData):
+        index = in_obj._get_sorted_index()
+        times = index.times
+        values = in_obj._value_array
+    else:
+        times, values = _series_arrays(in_obj)
+        index = _SortedIndex(times)
+        times = index.times
+    if index.order is not None:
+        values = values[index.order]
+
+    seconds = times.astype(np.int64)
+    valid = ~np.isnan(values)
+    # centered values keep the sum of squares well conditioned
+    center = values[valid].mean() if valid.any() else 0.0
+    shifted = np.where(valid, values - center, 0.0)
+    sums = {
+        'count': np.concatenate(([0], np.cumsum(valid))),
+        'sum': np.concatenate(([0.0], np.cumsum(shifted))),
+        'squares': np.concatenate(([0.0], np.cumsum(shifted ** 2))),
+        'in_range': np.concatenate(([0], np.cumsum(
+            valid & (values >= low) & (values <= high)))),
+    }
+    rows = np.arange(len(values))
+    # first valid row at or after every row, for rate_of_change
+    next_valid = np.minimum.accumulate(
+        np.where(valid, rows, len(values))[::-1])[::-1]
+
+    results = {}
+    for window in windows:
+        left = np.searchsorted(seconds, seconds - window * 60, side='right')
+
+        def total(name):
+            return sums[name][rows + 1] - sums[name][left]
+
+        count = total('count')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total('sum') / count
+            columns = {}
+            for stat in stats:
+                if stat == 'mean':
+                    column = mean + center
+                elif stat == 'std':
+                    column = np.sqrt(np.maximum(
+                        total('squares') / count - mean ** 2, 0.0))
+                elif stat == 'min' or stat == 'max':
+                    column = _rolling_extreme(values, left, stat == 'max')
+                elif stat == 'count':
+                    column = count.astype(np.float64)
+                elif stat == 'time_in_range':
+                    column = 100.0 * total('in_range') / count
+                else:
+                    first = next_valid[np.minimum(left, len(values) - 1)]
+                    first = np.minimum(first, rows)
+                    column = (values - values[first]) / \
+                        ((seconds - seconds[first]) / 60.0)
+                    column[(first == rows) | ~valid] = np.nan
+                columns[stat] = TimeSeries(times, column)
+        results[window] = columns
+    if single:
+        return results[windows[0]]
+    return results
+
+
+class AlignedData:
+    """
+    Columnar result of aligning several series on the key series
+
+    Attributes
+    ----------
+    names : list of strings
+        column labels, the key series first
+    times : numpy.ndarray
+        datetime64[s] times of the key series, one per output row
+    values : numpy.ndarray
+        float64 array of shape (rows, columns), column 0 is the key series
+    found : numpy.ndarray
+        bool array of shape (rows, columns), False where a series had
+        no value at the row's time
+    """
 
-        with open(data_csv, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if 'time' not in row.keys() or 'value' not in row.keys():
-                    raise KeyError(
-                        "ImportData: the file provided does" +
-                        "not have columns for time or value")
-                if row['value'] == '' or row['time'] == '':
-                    continue
-                else:
-                    try:
-                        self._time.append(dateutil.parser.parse(row['time']))
-                    except ValueError:
-                        if verbose:
-                            print('Bad input format for time, skipping value')
-                            print(row['time'])
-                        continue
-                    if highlow:
-                        if row['value'] == 'high':
-                            self._value.append(300.0)
-                            print('Changed high entry to 300 at', row['time'])
-                            continue
-                        if row['value'] == 'low':
-                            self._value.append(40.0)
-                            print('Changed low entry to 40 at', row['time'])
-                            continue
-                    try:
-                        self._value.append(float(row['value']))
-                    except ValueError:
-                        if verbose:
-                            print('Bad input format for value, skipping value')
-                            print(row['value'])
-                        self._time = self._time[:-1]
-                        continue
-            f.close()
+    def __init__(self, names, times, values, found):
+        self.names = names
+        self.times = times
+        self.values = values
+        self.found = found
 
-    def linear_search_value(self, key_time):
+    def _cells(self, missing, float_precision, time_format, start, stop):
         """
-        performs a linear search on the time array
-        and returns the corresponding value
+        object array of the time strings and the values of rows
+        start:stop, floats (or their formatted text) and missing
+        """
+        values = self.values[start:stop]
+        cells = np.empty((len(values), len(self.names) + 1), dtype=object)
+        cells[:, 0] = formatTimeArray(self.times[start:stop], time_format)
+        if float_precision is None:
+            # str() of the python floats, the same as before
+            cells[:, 1:] = values
+        else:
+            layout = '%.' + str(int(float_precision)) + 'f'
+            for column in range(len(self.names)):
+                cells[:, column + 1] = list(map(
+                    layout.__mod__, values[:, column].tolist()))
+        cells[:, 1:][~self.found[start:stop]] = missing
+        return cells
+
+    def format_columns(self, missing='0', float_precision=None,
+                       time_format=None):
+        """
+        formats every column as a list of strings, the same way
+        str() formats datetime.datetime and float objects
 
         Arguments
         ---------
-        key_time : datetime.datetime
-            a datetime object used to denote the time/date of
-            a measurement was taken
+        missing : string
+            text written where a series had no value
+        float_precision : int
+            digits after the decimal point, None keeps str()
+        time_format : string
+            layout of the time column, see formatTimeArray
 
         Returns
         -------
-        hit_list : array of values corresponding to the specific date/time
+        cells : list of lists of strings
+            the time column followed by one column per series
         """
-        # return list of value(s) associated with key_time
-        # if none, return -1 and error message
-        if not isinstance(key_time, datetime.datetime):
-            raise TypeError(
-                "ImportData.linear_search_value : this function only " +
-                "supports datetime.datetime inputs")
-        hit_list = []
-        for i in range(len(self._time)):
-            if key_time == self._time[i]:
-                hit_list.append(self._value[i])
-        if len(hit_list) == 0:
-            print("Time Value not in csv")
-            return(-1)
-        else:
-            return(hit_list)
+        cells = self._cells(missing, float_precision, time_format,
+                            0, len(self.times))
+        return [[str(cell) for cell in cells[:, column].tolist()]
+                for column in range(cells.shape[1])]
 
-    def sort_data(self):
+    def format_text(self, missing='0', float_precision=None,
+                    time_format=None, start=0, stop=None):
         """
-        sorts list before running a binary search
+        formats rows start:stop as printArray csv lines (every cell is
+        followed by a comma) with a single string format call
+
+        Returns
+        -------
+        text : string
         """
-        times = self._time.copy()
-        values = self._value.copy()
-        zip_time_vals = zip(times, values)
-        zip_sorted = sorted(zip_time_vals)
-        times, values = zip(*zip_sorted)
-        self._time = list(times)
-        self._values = list(values)
+        cells = self._cells(missing, float_precision, time_format,
+                            start, stop)
+        layout = '%s,' * cells.shape[1] + '\n'
+        return (layout * len(cells)) % tuple(cells.ravel().tolist())
 
-    def binary_search_value(self, key_time):
-        # optional extra credit
-        # return list of value(s) associated with key_time
-        # if none, return -1 and error message
-        lo = -1
-        hi = len(self._time)
-        hit_list = []
-        while (hi - lo > 1):
-            # print("Searching...")
-            mid = (hi + lo) // 2
-            if key_time == self._time[mid]:
-                # print("Found it!")
-                up = 0
-                down = 0
-                while True:
-                    update = False
-                    # print("high at:", mid+up)
-                    # print("low at:", mid-down)
-                    # print("lo =", 0, "hi =", len(self._time))
-                    if up == 0 and down == 0:
-                        hit_list.append(self._value[mid])
-                        if mid-down > 0:
-                            down += 1
-                        if mid+up < len(self._time)-1:
-                            up += 1
-                        continue
-                    if key_time == self._time[mid+up]:
-                        hit_list.append(self._value[mid+up])
-                        if mid+up < len(self._time)-1:
-                            up += 1
-                            update = True
-                    if key_time == self._time[mid-down]:
-                        hit_list.append(self._value[mid-down])
-                        if mid-down > 0:
-                            down += 1
-                            update = True
-                    if update is False:
-                        # print(hit_list)
-                        # print(self._time[mid])
-                        break
+
+# rows formatted and written at a time by _write_csv
+_WRITE_BLOCK_ROWS = 1 << 16
+
+
+def _write_csv(aligned, file_name, float_precision=None, time_format=None,
+               compress=False, missing='0', block_rows=_WRITE_BLOCK_ROWS):
+    """
+    writes an AlignedData in the printArray layout, formatting whole
+    blocks of block_rows rows and writing each with one call
+    """
+    import gzip
+    if compress:
+        # the numeric text compresses about as well at level 1, and
+        # several times faster than at the default 9
+        f = gzip.open(file_name, 'wt', compresslevel=1)
+    else:
+        f = open(file_name, 'w')
+    with f:
+        f.write(''.join(name + ',' for name in ['time'] + aligned.names))
+        f.write('\n')
+        for start in range(0, len(aligned.times), block_rows):
+            f.write(aligned.format_text(
+                missing, float_precision, time_format, start,
+                start + block_rows))
+
+
+def _write_npz(aligned, file_name):
+    """
+    writes an AlignedData as an uncompressed .npz archive holding the
+    time, values, found and names arrays, see loadArray
+    """
+    with open(file_name, 'wb') as f:
+        np.savez(f, time=aligned.times, values=aligned.values,
+                 found=aligned.found, names=np.array(aligned.names))
+
+
+def _write_arrow(aligned, file_name):
+    """
+    writes an AlignedData as an Arrow IPC file with a timestamp[s]
+    time column and one float64 column per series, null where the
+    series had no value
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError(
+            "printArray: output_format 'arrow' needs the pyarrow package!")
+    columns = [pyarrow.array(aligned.times, type=pyarrow.timestamp('s'))]
+    for column in range(len(aligned.names)):
+        columns.append(pyarrow.array(aligned.values[:, column],
+                                     mask=~aligned.found[:, column]))
+    table = pyarrow.Table.from_arrays(columns,
+                                      names=['time'] + aligned.names)
+    with pyarrow.OSFile(file_name, 'wb') as sink:
+        with pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+# output_format of printArray -> (file extension, writer)
+_WRITERS = {
+    'csv': ('.csv', _write_csv),
+    'npz': ('.npz', _write_npz),
+    'arrow': ('.arrow', _write_arrow),
+}
+
+
+def _npz_member(f, info, mmap_mode):
+    """
+    memory-maps one uncompressed .npy member of an open .npz file
+    """
+    # the local header is 30 bytes plus the name and extra fields
+    f.seek(info.header_offset + 26)
+    name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2')
+    f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    return np.memmap(f, dtype=dtype, mode=mmap_mode, offset=f.tell(),
+                     shape=shape, order='F' if fortran else 'C')
+
+
+def loadArray(file_name, mmap_mode='r'):
+    """
+    loads a merged file written by printArray with output_format 'npz'
+    or 'arrow' without parsing any text
+
+    Arguments
+    ---------
+    file_name : string
+        .npz or .arrow file written by printArray
+    mmap_mode : string
+        'r' memory-maps the time, values and found arrays of an .npz
+        file, so rows are only read from disk when they are used,
+        None reads them into memory
+
+    Returns
+    -------
+    aligned : AlignedData
+        the aligned columns printArray wrote
+    """
+    import zipfile
+    if not isinstance(file_name, str):
+        raise TypeError("loadArray: file_name must be a string!")
+    if file_name.endswith('.arrow'):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise ImportError(
+                "loadArray: .arrow files need the pyarrow package!")
+        with pyarrow.memory_map(file_name, 'r') as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+        names = table.column_names[1:]
+        times = table.column(0).to_numpy().astype('datetime64[s]')
+        values = np.zeros((len(times), len(names)))
+        found = np.zeros((len(times), len(names)), dtype=bool)
+        for column, name in enumerate(names):
+            series = table.column(name)
+            found[:, column] = series.is_valid().to_numpy()
+            values[:, column] = series.fill_null(0).to_numpy()
+        return AlignedData(names, times, values, found)
+    if mmap_mode is None:
+        with np.load(file_name) as archive:
+            return AlignedData(archive['names'].tolist(), archive['time'],
+                               archive['values'], archive['found'])
+    arrays = {}
+    with open(file_name, 'rb') as f, zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(
+                    "loadArray: compressed .npz files can not be mapped!")
+            arrays[info.filename[:-len('.npy')]] = _npz_member(
+                f, info, mmap_mode)
+    return AlignedData(arrays['names'].tolist(), arrays['time'],
+                       arrays['values'], arrays['found'])
+
+
+def _series_arrays(series):
+    """
+    unpacks a TimeSeries or an iterable of (datetime, value) pairs into
+    datetime64[s] and float64 arrays
+    """
+    if isinstance(series, TimeSeries):
+        return series.times, series.values
+    pairs = list(series)
+    times = _to_datetime64_array([pair[0] for pair in pairs])
+    values = np.array([pair[1] for pair in pairs], dtype=np.float64)
+    return times, values
+
+
+def _key_columns(annotation_list, key_file, caller):
+    """
+    returns the output column order (the key_file series first, when
+    one is given) and the column names of the series in annotation_list
+    """
+    columns = list(range(len(annotation_list)))
+    if key_file is not None:
+        key_index = None
+        for i in range(len(annotation_list)):
+            if key_file in annotation_list[i]:
+                key_index = i
                 break
-            if (key_time < self._time[mid]):
-                hi = mid
-            else:
-                lo = mid
-        if len(hit_list) == 0:
-            print(self._file_name)
-            print("Time Value not in csv")
-            return(-1)
-        else:
-            return(hit_list)
+        if key_index is None:
+            raise IndexError(
+                caller + ": key_file is not in annotation_list!")
+        columns.remove(key_index)
+        columns.insert(0, key_index)
+    names = [annotation_list[i].split('/')[-1].split('_')[0]
+             for i in columns]
+    return columns, names
 
 
-def roundTimeArray(in_obj, res, operation='average',
-                   modify=False, search_type="linear"):
+def alignArray(data_list, annotation_list, key_file):
     """
-    used to reformat time and value array of an ImportData object
+    aligns every series on the times of the key series with one
+    sort-merge join per series, O(N log N) in the total number of rows
 
     Arguments
     ---------
-    in_obj : ImportData
-        an instance of an ImportData object that whos data will be transformed
-    res : int
-        resolution in minutes of the new transformed data
-    operation : string
-        how value data will be reconsiled for multiple times
-    modify : bool
-        whether this function changes the original ImportData object
+    data_list : list of TimeSeries or zip objects
+        list of (date, value) pair series. see output of roundTimeArray
+    annotation_list : list of strings
+        list of strings with column labes for data value
+    key_file : str
+        name from annotation list to align data on
 
     Returns
     -------
-    zip_obj : zip
-        a zip object containing parallel arrays of new times and values
+    aligned : AlignedData
+        key times and the matching value of every series, when a series
+        has repeated times the first one is used
+    """
+    columns, names = _key_columns(annotation_list, key_file, "alignArray")
+    key_index = columns[0]
+    arrays = [_series_arrays(series) for series in data_list]
 
+    key_times, key_values = arrays[key_index]
+    key_seconds = key_times.astype(np.int64)
+    values = np.zeros((len(key_times), len(columns)), dtype=np.float64)
+    found = np.zeros((len(key_times), len(columns)), dtype=bool)
+    values[:, 0] = key_values
+    found[:, 0] = True
+    for column, index in enumerate(columns[1:], 1):
+        times, series_values = arrays[index]
+        groups = _Groups(times.astype(np.int64))
+        if len(groups) == 0:
+            continue
+        position = np.searchsorted(groups.keys, key_seconds)
+        position = np.minimum(position, len(groups) - 1)
+        hit = groups.keys[position] == key_seconds
+        first_row = groups.order[groups.starts[position[hit]]]
+        values[hit, column] = series_values[first_row]
+        found[hit, column] = True
+    return AlignedData(names, key_times, values, found)
+
+
+def resampleArray(data_list, annotation_list, res, key_file=None,
+                  start=None, end=None):
     """
-    # Inputs: obj (ImportData Object) and res (rounding resoultion)
-    # objective:
-    # create a list of datetime entries and associated values
-    # with the times rounded to the nearest rounding resolution (res)
-    # ensure no duplicated times
-    # handle duplicated values for a single timestamp based on instructions in
-    # the assignment
-    # return: iterable zip object of the two lists
-    # note: you can create additional variables to help with this task
-    # which are not returned
-    if modify:
-        obj = in_obj
-    else:
-        obj = copy.deepcopy(in_obj)
-    if search_type == 'binary':
-        obj.sort_data()
+    places every series on one regular time grid shared by all inputs,
+    scattering each row into its bucket by integer index in O(N)
 
-    if not isinstance(obj, ImportData):
-        raise TypeError(
-            "roundTimeArray: in_obj was not of the class ImportData!")
+    Arguments
+    ---------
+    data_list : list of TimeSeries or zip objects
+        rounded series, see roundTimeArray with the same res (res must
+        divide an hour so every series lands on the same grid), a row
+        goes to the grid bucket it falls in, the last row of a bucket
+        wins
+    annotation_list : list of strings
+        list of strings with column labes for data value
+    res : int
+        grid resolution in minutes
+    key_file : str
+        optional, name from annotation list whose column comes first,
+        as in alignArray, it does not decide which rows exist
+    start, end : datetime.datetime
+        first and last grid time, by default the earliest and latest
+        time of any series, rows outside them are dropped
+
+    Returns
+    -------
+    aligned : AlignedData
+        one row per grid time, values is a dense (time x stream) array
+        holding NaN and found False where a series had no value
+    """
     if not isinstance(res, int):
-        raise TypeError("roundTimeArray: res was not an int!")
-    if not isinstance(operation, str):
-        raise TypeError("roundTimeArray: operation was not a string!")
-    if not isinstance(modify, bool):
-        raise TypeError("roundTimeArray: modify must be a bool!")
-    if not operation == "average" and not operation == "sum":
-        raise NotImplementedError(
-            "roundTimeArray: "+operation+" not implemented!")
-    new_values = []
-    new_times = []
-    for time in obj._time:
-        minminus = datetime.timedelta(minutes=(time.minute % res))
-        minplus = datetime.timedelta(minutes=res) - minminus
-        if (time.minute % res) <= res/2:
-            newtime = time - minminus
-        else:
-            newtime = time + minplus
-        new_times.append(newtime)
-    obj._time = new_times
-    unique_times = []
-    for new_time in new_times:
-        if new_time not in unique_times:
-            if search_type == "linear":
-                if operation == 'average':
-                    new_value = np.average(obj.linear_search_value(new_time))
-                if operation == 'sum':
-                    new_value = np.sum(obj.linear_search_value(new_time))
-            if search_type == "binary":
-                if operation == 'average':
-                    new_value = np.average(obj.binary_search_value(new_time))
-                if operation == 'sum':
-                    new_value = np.sum(obj.binary_search_value(new_time))
-            new_values.append(new_value)
-            unique_times.append(new_time)
-        else:
-            continue
-    obj._time = unique_times
-    obj._value = new_values
-    return(zip(obj._time, obj._value))
+        raise TypeError("resampleArray: res was not an int!")
+    if res <= 0:
+        raise ValueError("resampleArray: res must be positive!")
+    if 60 % res:
+        # rounding restarts every hour, see fillGaps
+        raise ValueError("resampleArray: res must divide an hour!")
+    columns, names = _key_columns(annotation_list, key_file, "resampleArray")
+    arrays = [_series_arrays(data_list[i]) for i in columns]
+    step = res * 60
+    seconds = [times.astype(np.int64) for times, values in arrays]
+    nonempty = [column for column in seconds if len(column)]
+    if start is not None:
+        first = _to_seconds(start)
+    elif nonempty:
+        first = min(column.min() for column in nonempty) // step * step
+    else:
+        first = 0
+    if end is not None:
+        last = _to_seconds(end)
+    elif nonempty:
+        last = max(column.max() for column in nonempty)
+    else:
+        last = first - step
+    rows = max(0, (last - first) // step + 1)
+    values = np.full((rows, len(columns)), np.nan)
+    found = np.zeros((rows, len(columns)), dtype=bool)
+    for column, (times, series_values) in enumerate(arrays):
+        offsets = seconds[column] - first
+        inside = (offsets >= 0) & (seconds[column] <= last)
+        # rounded times keep their seconds, so rows are put in the
+        # bucket they fall in rather than required to sit on the grid
+        buckets = offsets[inside] // step
+        values[buckets, column] = series_values[inside]
+        found[buckets, column] = True
+    times = (first + np.arange(rows) * step).astype('datetime64[s]')
+    return AlignedData(names, times, values, found)
 
 
-def printArray(data_list, annotation_list, base_name, key_file):
+def printArray(data_list, annotation_list, base_name, key_file,
+               stats=None, float_precision=None, time_format=None,
+               compress=False, output_format='csv', missing='0',
+               grid_res=None):
     """
     a function which aligns data sets based on datetime objects
 
     Arguments
     ---------
-    data_list : list of zip objects
-        list of zipped (date, value) pairs. see output of roundTimeArray
+    data_list : list of TimeSeries or zip objects
+        list of (date, value) pair series. see output of roundTimeArray
     annotation_list : list of strings
         list of strings with column labes for data value
     base_name : str
         name of file to output to
     key_file : str
         name from annotation list to align data on
+    stats : PipelineStats
+        optional, collects the align and write timings and the rows and
+        bytes written
+    float_precision : int
+        digits written after the decimal point, None writes the shortest
+        text that reads back as the same float
+    time_format : string
+        layout of the time column (e.g. '%m/%d/%y %H:%M'), see
+        formatTimeArray, None writes 'YYYY-MM-DD HH:MM:SS'
+    compress : bool
+        gzip the output, '.gz' is added to base_name
+    output_format : string
+        'csv', or a typed binary format that loadArray reads back
+        without parsing: 'npz' (uncompressed numpy arrays that can be
+        memory-mapped) or 'arrow' (Arrow IPC file, needs pyarrow), the
+        extension of base_name is replaced to match
+    missing : string
+        csv text written where a series has no value at a key time,
+        see fillGaps for putting series on a regular grid first
+    grid_res : int
+        when given, the rows are every grid_res minutes from the earliest
+        to the latest time of any series (see resampleArray) instead of
+        the times of the key_file series
+
+    Returns
+    -------
+    file_name : str
+        name of the file that was written
     """
     # Exception raising
 
@@ -294,12 +3328,21 @@ def printArray(data_list, annotation_list, base_name, key_file):
         raise TypeError("printArray: base_name in must be a string type!")
     if not isinstance(key_file, str):
         raise TypeError("printArray: key_file in must be a string type!")
+    if output_format not in _WRITERS:
+        raise ValueError("printArray: output_format must be one of " +
+                         ', '.join(_WRITERS) + "!")
+    if output_format != 'csv' and (compress or float_precision is not None
+                                   or time_format is not None):
+        raise ValueError("printArray: compress, float_precision and " +
+                         "time_format only apply to csv output!")
 
-    type_data_list = [not isinstance(data, zip) for data in data_list]
+    type_data_list = [not isinstance(data, (TimeSeries, zip))
+                      for data in data_list]
     type_ann_list = [not isinstance(ann, str) for ann in annotation_list]
     if any(type_data_list):
         raise TypeError(
-            "printArray: a value in data_list was not a zip type!")
+            "printArray: a value in data_list was not a TimeSeries " +
+            "or zip type!")
     if any(type_ann_list):
         raise IndexError(
             "printArray: a value in annotation_list was not a string type!")
@@ -310,42 +3353,511 @@ def printArray(data_list, annotation_list, base_name, key_file):
 
     # combine and print on the key_file
 
-    base_data = []
-    key_index = 0
-    data_list = [list(zip_obj) for zip_obj in data_list]
-    for i in range(len(annotation_list)):
-        if key_file in annotation_list[i]:
-            base_data = data_list[i]
-            key_index = i
-            break
-        if i == len(annotation_list)-1:
-            print("Key not found", file=sys.stderr)
-            sys.exit(1)
-    if '.csv'not in base_name:
+    with _stage(stats, 'align'):
+        if grid_res is None:
+            aligned = alignArray(data_list, annotation_list, key_file)
+        else:
+            aligned = resampleArray(data_list, annotation_list, grid_res,
+                                    key_file)
+    extension, writer = _WRITERS[output_format]
+    if output_format != 'csv':
+        if base_name.endswith('.csv'):
+            base_name = base_name[:-len('.csv')]
+        if not base_name.endswith(extension):
+            base_name = base_name + extension
+    elif '.csv'not in base_name:
         base_name = base_name+'.csv'
+    if compress and not base_name.endswith('.gz'):
+        base_name = base_name + '.gz'
+
+    with _stage(stats, 'write'):
+        if output_format == 'csv':
+            writer(aligned, base_name, float_precision, time_format,
+                   compress, missing)
+        else:
+            writer(aligned, base_name)
+    if stats is not None:
+        stats.count('rows_written', len(aligned.times))
+        stats.count('bytes_written', os.path.getsize(base_name))
+    return base_name
 
-    with open(base_name, 'w') as f:
-        f.write('time,')
-        f.write(annotation_list[key_index].split('/')[-1].split('_')[0]+',')
-        non_key = list(range(len(annotation_list)))
-        non_key.remove(key_index)
 
-        for index in non_key:
-            f.write(annotation_list[index].split('/')[-1].split('_')[0]+',')
-        f.write('\n')
+class IncrementalMerge:
+    """
+    Merged output file of printArray kept up to date as rows arrive
 
-        for time, value in base_data:
-            f.write(str(time)+','+str(value)+',')
-            for n in non_key:
-                t_list = [pair[0] for pair in data_list[n]]
-                if time in t_list:
-                    f.write(str(data_list[n][t_list.index(time)][1])+',')
-                else:
-                    f.write('0,')
-            f.write('\n')
+    Every series is rounded by an IncrementalRound. On update only the
+    rows whose buckets changed are re-aligned: the file is truncated at
+    the first changed row and the rows from there on are written again,
+    new key buckets are appended at the end. For time ordered feeds
+    only the last few rows are rewritten.
+    """
+
+    def __init__(self, data_list, annotation_list, base_name, key_file,
+                 res, operation='average'):
+        """
+        writes the merged file for the rows received so far
+
+        Arguments
+        ---------
+        data_list : list of ImportData
+            one object per series
+        annotation_list : list of strings
+            list of strings with column labes for data value
+        base_name : str
+            name of file to output to
+        key_file : str
+            name from annotation list to align data on
+        res : int
+            rounding resolution in minutes
+        operation : string or list of strings
+            decomposable operation used for every series, or one per series
+        """
+        if not isinstance(data_list, list) or \
+                not all(isinstance(data, ImportData) for data in data_list):
+            raise TypeError(
+                "IncrementalMerge: data_list must be a list of ImportData!")
+        if not isinstance(annotation_list, list) or \
+                len(annotation_list) != len(data_list):
+            raise TypeError("IncrementalMerge: annotation_list must be a " +
+                            "list with one entry per series!")
+        if not isinstance(base_name, str):
+            raise TypeError("IncrementalMerge: base_name must be a string!")
+        if not isinstance(operation, list):
+            operation = [operation] * len(data_list)
+        self._data = data_list
+        self._rounds = [IncrementalRound(data, res, op)
+                        for data, op in zip(data_list, operation)]
+        self._key_index = None
+        for i in range(len(annotation_list)):
+            if key_file in annotation_list[i]:
+                self._key_index = i
+                break
+        if self._key_index is None:
+            raise IndexError(
+                "IncrementalMerge: key_file is not in annotation_list!")
+        self._columns = [self._key_index] + [
+            i for i in range(len(data_list)) if i != self._key_index]
+        self._names = [annotation_list[i].split('/')[-1].split('_')[0]
+                       for i in self._columns]
+        if '.csv' not in base_name:
+            base_name = base_name + '.csv'
+        self.base_name = base_name
+
+        key_times = self._rounds[self._key_index].result().times.astype(
+            np.int64)
+        self._row_times = []
+        self._row_index = {}
+        self._row_offsets = []
+        header = ''.join(name + ',' for name in ['time'] + self._names)
+        with open(self.base_name, 'w', newline='') as f:
+            f.write(header + '\n')
+        self._end_offset = len(header) + 1
+        self._write_rows(0, key_times)
+
+    def _write_rows(self, start_row, new_times):
+        """
+        rewrites the rows from start_row on and appends new key buckets
+        """
+        times = np.concatenate([
+            np.array(self._row_times[start_row:], dtype=np.int64),
+            new_times])
+        values = np.zeros((len(times), len(self._columns)))
+        found = np.zeros((len(times), len(self._columns)), dtype=bool)
+        for column, index in enumerate(self._columns):
+            values[:, column], found[:, column] = \
+                self._rounds[index].lookup(times)
+        aligned = AlignedData(self._names, times.astype('datetime64[s]'),
+                              values, found)
+        lines = aligned.format_text().splitlines(True)
+
+        if start_row < len(self._row_offsets):
+            offset = self._row_offsets[start_row]
+        else:
+            offset = self._end_offset
+        del self._row_offsets[start_row:]
+        for time in new_times.tolist():
+            self._row_index[time] = len(self._row_times)
+            self._row_times.append(time)
+        with open(self.base_name, 'r+', newline='') as f:
+            f.seek(offset)
+            f.truncate()
+            for line in lines:
+                self._row_offsets.append(offset)
+                offset += len(line.encode('utf-8'))
+            f.write(''.join(lines))
+        self._end_offset = offset
+        return len(lines)
+
+    def update(self, new_rows):
+        """
+        folds new rows into the rounded series and refreshes the file
+
+        Arguments
+        ---------
+        new_rows : list
+            one (times, values) pair per series (or None when a series
+            has nothing new), e.g. from ImportData.append_csv
+
+        Returns
+        -------
+        rows_written : int
+            number of output rows that were (re)written
+        """
+        if len(new_rows) != len(self._rounds):
+            raise ValueError(
+                "IncrementalMerge: new_rows needs one entry per series!")
+        first_changed = len(self._row_times)
+        new_times = np.zeros(0, dtype=np.int64)
+        for i, rows in enumerate(new_rows):
+            if rows is None or len(rows[0]) == 0:
+                continue
+            changed, is_new = self._rounds[i].update(*rows)
+            if i == self._key_index:
+                new_times = changed[is_new]
+                changed = changed[~is_new]
+            for time in changed.tolist():
+                row = self._row_index.get(time)
+                if row is not None and row < first_changed:
+                    first_changed = row
+        if first_changed == len(self._row_times) and len(new_times) == 0:
+            return 0
+        return self._write_rows(first_changed, new_times)
+
+    def update_from_csv(self):
+        """
+        reads the rows appended to every source csv file since the last
+        read (see ImportData.append_csv) and applies them
+
+        Returns
+        -------
+        rows_written : int
+            number of output rows that were (re)written
+        """
+        return self.update([data.append_csv() for data in self._data])
+
+
+def _import_options(file_name):
+    """
+    per file settings used by the command line pipeline
+
+    Returns
+    -------
+    highlow : bool
+        cgm files get their high/low entries replaced
+    operation : string
+        how values sharing a rounded time are combined
+    """
+    highlow = 'cgm' in file_name
+    sum_key = [
+        add_file in file_name for add_file in
+        ['activity', 'bolus', 'meal']
+    ]
+    if any(sum_key):
+        return highlow, 'add'
+    return highlow, 'average'
+
+
+def _fill_folder_gaps(files_lst, data_list, res, strategy, max_gap):
+    """
+    replaces the averaged series of one folder by their gap filled grid
+    series (see fillGaps), summed streams are left as they are
+
+    Returns
+    -------
+    gaps : list of tuples
+        (file name, GapStats) of every filled series
+    """
+    gaps = []
+    for i, file_name in enumerate(files_lst):
+        if _import_options(file_name)[1] != 'average':
+            continue
+        data_list[i], gap_stats = fillGaps(data_list[i], res, strategy,
+                                           max_gap)
+        gaps.append((file_name, gap_stats))
+    return gaps
+
+
+def _import_and_round(file_name, resolutions, cache_dir=None, stats=None):
+    """
+    process pool worker: imports one file and rounds it at every
+    resolution, returning plain arrays so the result pickles cheaply,
+    together with the stats object that was passed in
+    """
+    highlow, operation = _import_options(file_name)
+    data = ImportData(file_name, highlow=highlow, cache_dir=cache_dir,
+                      stats=stats)
+    aggregation = _get_aggregations(operation, "importFolder")[0][0]
+    with _stage(stats, 'round'):
+        results = _round_levels(data._time_array, data._value_array,
+                                resolutions, aggregation)
+    return [results[res] for res in resolutions], stats
+
+
+def importFolder(folder_name, resolutions=(5, 15), jobs=1, cache_dir=None,
+                 stats=None):
+    """
+    imports and rounds every file in a folder, optionally spreading the
+    files over a pool of worker processes
+
+    Arguments
+    ---------
+    folder_name : string
+        folder holding the csv files
+    resolutions : list of ints
+        rounding resolutions in minutes
+    jobs : int
+        number of worker processes, 1 runs everything in this process
+        and None uses one process per cpu
+    cache_dir : string
+        optional parse cache folder, see ImportData
+    stats : PipelineStats
+        optional, collects the read, parse and round stages of every
+        file, including those run in worker processes
+
+    Returns
+    -------
+    files_lst : list of strings
+        path of every file in the folder, in os.listdir order
+    rounded : list of lists of TimeSeries
+        rounded[i][j] is file j rounded at resolutions[i], the order does
+        not depend on jobs so printArray output matches a serial run
+    """
+    import concurrent.futures
+    if jobs is not None and (not isinstance(jobs, int) or jobs <= 0):
+        raise ValueError("importFolder: jobs must be a positive int!")
+    files_lst = [os.path.join(folder_name, csv_file)
+                 for csv_file in os.listdir(folder_name)]
+    resolutions = list(resolutions)
+    if jobs == 1 or len(files_lst) <= 1:
+        results = [_import_and_round(file_name, resolutions, cache_dir,
+                                     stats)[0]
+                   for file_name in files_lst]
+    else:
+        # every worker fills its own copy, merged back in here
+        worker_stats = [None if stats is None else PipelineStats()
+                        for file_name in files_lst]
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            returned = list(executor.map(
+                _import_and_round, files_lst,
+                [resolutions] * len(files_lst),
+                [cache_dir] * len(files_lst), worker_stats))
+        results = [result for result, file_stats in returned]
+        if stats is not None:
+            for result, file_stats in returned:
+                stats.merge(file_stats)
+    rounded = []
+    for i in range(len(resolutions)):
+        rounded.append([TimeSeries(*result[i]) for result in results])
+    return files_lst, rounded
+
+
+def _read_text(file_name):
+    with open(file_name, 'r') as f:
+        return f.read()
+
+
+def _round_csv_text(file_name, text, resolutions, stats=None):
+    """
+    executor worker of processFolders: parses the text of one csv file
+    and rounds it at every resolution, like _import_and_round
+    """
+    highlow, operation = _import_options(file_name)
+    if stats is not None:
+        stats.count('bytes_read', os.path.getsize(file_name))
+    times = []
+    values = []
+    for time_block, value_block in _iter_line_blocks(
+            io.StringIO(text), _CHUNK_SIZE, highlow, False, None, stats):
+        times.append(time_block)
+        values.append(value_block)
+    times = np.concatenate(times or [np.zeros(0, 'datetime64[s]')])
+    values = np.concatenate(values or [np.zeros(0)])
+    aggregation = _get_aggregations(operation, "processFolders")[0][0]
+    with _stage(stats, 'round'):
+        results = _round_levels(times, values, resolutions, aggregation)
+    return [results[res] for res in resolutions], stats
+
+
+async def _process_folder(folder_name, output_dir, sort_key, resolutions,
+                          options, stats, semaphore, io_executor,
+                          cpu_executor):
+    """
+    imports, rounds and prints one folder, returning its report entry,
+    options holds the processFolders keyword arguments
+    """
+    import asyncio
+    report = {'folder': folder_name, 'outputs': [], 'gaps': [],
+              'error': None}
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    # one stats object per file and folder, the threads and processes
+    # never share one, they are merged here on the event loop
+    folder_stats = None if stats is None else PipelineStats()
+
+    async def import_file(file_name):
+        file_stats = None if stats is None else PipelineStats()
+        if options['cache_dir'] is not None:
+            # cached files are memory-mapped by the worker, not read here
+            return await loop.run_in_executor(
+                cpu_executor, _import_and_round, file_name, resolutions,
+                options['cache_dir'], file_stats)
+        # the next file is read while earlier ones are being parsed
+        text = await loop.run_in_executor(io_executor, _read_text,
+                                          file_name)
+        return await loop.run_in_executor(
+            cpu_executor, _round_csv_text, file_name, text, resolutions,
+            file_stats)
+
+    async with semaphore:
+        try:
+            files_lst = [os.path.join(folder_name, csv_file)
+                         for csv_file in await loop.run_in_executor(
+                             io_executor, os.listdir, folder_name)]
+            returned = await asyncio.gather(
+                *[import_file(file_name) for file_name in files_lst])
+            results = [result for result, file_stats in returned]
+            if folder_stats is not None:
+                for result, file_stats in returned:
+                    folder_stats.merge(file_stats)
+            base_name = os.path.join(
+                output_dir, os.path.basename(os.path.normpath(folder_name)))
+            for i, res in enumerate(resolutions):
+                data_list = [TimeSeries(*result[i]) for result in results]
+                if options['fill_gaps'] is not None:
+                    report['gaps'].extend(
+                        (file_name, res, gap_stats)
+                        for file_name, gap_stats in _fill_folder_gaps(
+                            files_lst, data_list, res,
+                            options['fill_gaps'], options['max_gap']))
+                report['outputs'].append(await loop.run_in_executor(
+                    io_executor, functools.partial(
+                        printArray, data_list, files_lst,
+                        base_name + '_' + str(res) + '.csv', sort_key,
+                        stats=folder_stats,
+                        output_format=options['output_format'],
+                        missing=options['missing'],
+                        grid_res=res if options['grid'] else None)))
+        except Exception as error:
+            report['error'] = type(error).__name__ + ': ' + str(error)
+    if stats is not None:
+        stats.merge(folder_stats)
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+async def _process_folders(folders, output_dir, sort_key, resolutions,
+                           options, stats, jobs, max_folders):
+    import asyncio
+    import concurrent.futures
+    semaphore = asyncio.Semaphore(max_folders)
+    # a few threads per folder in flight for file reads and writes
+    with concurrent.futures.ThreadPoolExecutor(4 * max_folders) as \
+            io_executor:
+        if jobs == 1:
+            cpu_executor = io_executor
+        else:
+            cpu_executor = concurrent.futures.ProcessPoolExecutor(jobs)
+        try:
+            return await asyncio.gather(*[
+                _process_folder(folder_name, output_dir, sort_key,
+                                resolutions, options, stats, semaphore,
+                                io_executor, cpu_executor)
+                for folder_name in folders])
+        finally:
+            if cpu_executor is not io_executor:
+                cpu_executor.shutdown()
+
+
+def processFolders(folders, output_dir, sort_key, resolutions=(5, 15),
+                   jobs=None, max_folders=4, output_format='csv',
+                   cache_dir=None, stats=None, fill_gaps=None, max_gap=None,
+                   missing='0', grid=False):
+    """
+    runs the command line pipeline (import, round, printArray) for many
+    folders concurrently, reading files on an asyncio event loop while
+    a process pool parses and rounds the files already read
+
+    Arguments
+    ---------
+    folders : list of strings
+        folder names or glob patterns of folders (e.g. 'patients/*')
+    output_dir : string
+        folder the merged files are written to, named after each input
+        folder: <output_dir>/<folder>_<res>.csv
+    sort_key : string
+        file name part to align each folder on, see printArray
+    resolutions : list of ints
+        rounding resolutions in minutes, one output file per resolution
+    jobs : int
+        number of worker processes, 1 parses in threads of this process
+        and None uses one process per cpu
+    max_folders : int
+        number of folders processed at the same time
+    output_format : string
+        see printArray
+    cache_dir : string
+        optional parse cache folder, see ImportData
+    stats : PipelineStats
+        optional, collects the stages and counts of every folder,
+        including those run in worker processes
+    fill_gaps : string
+        optional strategy of fillGaps the averaged series are filled
+        with before they are printed, max_gap is passed along
+    missing : string
+        see printArray
+    grid : bool
+        write one row per grid time (printArray grid_res) instead of
+        one per sort_key time
+
+    Returns
+    -------
+    report : list of dicts
+        one entry per folder in input order with its 'folder', written
+        'outputs', 'seconds', 'error' (None on success) and 'gaps', the
+        (file name, res, GapStats) of every filled series, a folder
+        that fails does not stop the others
+    """
+    import asyncio
+    import glob
+    if not isinstance(folders, (list, tuple)) or \
+            not all(isinstance(folder, str) for folder in folders):
+        raise TypeError("processFolders: folders must be a list of strings!")
+    if jobs is not None and (not isinstance(jobs, int) or jobs <= 0):
+        raise ValueError("processFolders: jobs must be a positive int!")
+    if not isinstance(max_folders, int) or max_folders <= 0:
+        raise ValueError(
+            "processFolders: max_folders must be a positive int!")
+    if output_format not in _WRITERS:
+        raise ValueError("processFolders: output_format must be one of " +
+                         ', '.join(_WRITERS) + "!")
+    if fill_gaps is not None and fill_gaps not in GAP_STRATEGIES:
+        raise ValueError("processFolders: fill_gaps must be one of " +
+                         ', '.join(GAP_STRATEGIES) + "!")
+    expanded = []
+    for folder in folders:
+        if glob.has_magic(folder):
+            expanded.extend(sorted(name for name in glob.glob(folder)
+                                   if os.path.isdir(name)))
+        else:
+            expanded.append(folder)
+    names = [os.path.basename(os.path.normpath(folder))
+             for folder in expanded]
+    if len(set(names)) != len(names):
+        raise ValueError(
+            "processFolders: folder names must be unique, their outputs " +
+            "are named after them!")
+    os.makedirs(output_dir, exist_ok=True)
+    options = {'output_format': output_format, 'cache_dir': cache_dir,
+               'fill_gaps': fill_gaps, 'max_gap': max_gap,
+               'missing': missing, 'grid': grid}
+    return asyncio.run(_process_folders(
+        expanded, output_dir, sort_key, list(resolutions), options, stats,
+        jobs, max_folders))
 
 
 if __name__ == '__main__':
+    import argparse
 
     # adding arguments
     parser = argparse.ArgumentParser(description='A class to import,' +
@@ -360,63 +3872,130 @@ if __name__ == '__main__':
 
     parser.add_argument('--search_type', type=str,
                         help='method used list searches')
+
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of worker processes used to import ' +
+                        'and round the files')
+
+    parser.add_argument('--cache_dir', type=str,
+                        help='Folder used to cache parsed files between runs')
+
+    parser.add_argument('--output_format', type=str, default='csv',
+                        choices=sorted(_WRITERS),
+                        help='Format of the merged output files')
+
+    parser.add_argument('--profile', action='store_true',
+                        help='Print per-stage timings and row counts ' +
+                        'to stderr')
+
+    parser.add_argument('--fill_gaps', type=str, choices=GAP_STRATEGIES,
+                        help='Put averaged streams (not activity, bolus ' +
+                        'or meal) on a regular grid and fill missing ' +
+                        'buckets with this strategy')
+
+    parser.add_argument('--max_gap', type=int,
+                        help='Longest gap in minutes --fill_gaps fills')
+
+    parser.add_argument('--grid', action='store_true',
+                        help='Write one row per grid time across all ' +
+                        'streams instead of one per sort_key time')
+
+    parser.add_argument('--missing', type=str, default='0',
+                        help='Text written where a stream has no value')
+
+    parser.add_argument('--folders', type=str, nargs='+',
+                        help='Batch mode: folders or glob patterns of ' +
+                        'folders to process concurrently')
+
+    parser.add_argument('--output_dir', type=str, default='.',
+                        help='Batch mode: folder for the merged files')
+
+    parser.add_argument('--max_folders', type=int, default=4,
+                        help='Batch mode: folders processed at the same time')
     # parser.add_argument('--number_of_files', type=int,
     #                     help="Number of Files", required=False)
 
     args = parser.parse_args()
 
+    if args.jobs <= 0:
+        print("jobs must be a positive number!", file=sys.stderr)
+        sys.exit(1)
+
+    if args.folders is not None:
+        if args.max_folders <= 0:
+            print("max_folders must be a positive number!", file=sys.stderr)
+            sys.exit(1)
+        stats = PipelineStats() if args.profile else None
+        report = processFolders(args.folders, args.output_dir, args.sort_key,
+                                jobs=args.jobs, max_folders=args.max_folders,
+                                output_format=args.output_format,
+                                cache_dir=args.cache_dir, stats=stats,
+                                fill_gaps=args.fill_gaps,
+                                max_gap=args.max_gap, missing=args.missing,
+                                grid=args.grid)
+        for entry in report:
+            for file_name, res, gap_stats in entry['gaps']:
+                print(file_name + ' at ' + str(res) + ' minutes: ' +
+                      repr(gap_stats), file=sys.stderr)
+        failed = [entry for entry in report if entry['error'] is not None]
+        for entry in failed:
+            print(entry['folder'] + ': ' + entry['error'], file=sys.stderr)
+        print(str(len(report) - len(failed)) + ' of ' + str(len(report)) +
+              ' folders processed', file=sys.stderr)
+        if stats is not None:
+            print(stats.summary(), file=sys.stderr)
+        sys.exit(1 if failed else 0)
+
     if '.csv' in args.output_file:
         args.output_file = args.output_file.split('.csv')[0]
 
-    # pull all the folders in the file
+    stats = PipelineStats() if args.profile else None
 
-    files_lst = []  # list the folders
+    # import every file in the folder and round it to 5 and 15 minutes
     try:
-        csv_files = os.listdir(args.folder_name)
+        files_lst, (data_5, data_15) = importFolder(
+            args.folder_name, resolutions=[5, 15], jobs=args.jobs,
+            cache_dir=args.cache_dir, stats=stats)
     except FileNotFoundError:
         print("folder_name provided was not found!", file=sys.stderr)
         sys.exit(1)
-    for csv_file in csv_files:
-        files_lst.append(os.path.join(args.folder_name, csv_file))
-
-    # import all the files into a list of ImportData objects (in a loop!)
-    data_lst = []
-    for file_name in files_lst:
-        if 'cgm' in file_name:
-            data_lst.append(ImportData(file_name, highlow=True))
-        else:
-            data_lst.append(ImportData(file_name))
-
-    # create two new lists of zip objects
-    # do this in a loop, where you loop through the data_lst
-
-    data_5 = []  # a list with time rounded to 5min
-    data_15 = []  # a list with time rounded to 15min
-
-    for data_import_obj in data_lst:
-        sum_key = [
-            add_file in data_import_obj._file_name for add_file in
-            ['activity, bolus, meal']
-        ]
-        if any(sum_key):
-            data_5.append(roundTimeArray(data_import_obj, 5, operation='add'))
-            data_15.append(roundTimeArray(
-                data_import_obj, 15, operation='add'))
-        else:
-            data_5.append(roundTimeArray(data_import_obj, 5))
-            data_15.append(roundTimeArray(data_import_obj, 15))
+
+    if args.fill_gaps is not None:
+        for res, data_list in [(5, data_5), (15, data_15)]:
+            try:
+                gaps = _fill_folder_gaps(files_lst, data_list, res,
+                                         args.fill_gaps, args.max_gap)
+            except ValueError as error:
+                print(error, file=sys.stderr)
+                sys.exit(1)
+            for file_name, gap_stats in gaps:
+                print(file_name + ' at ' + str(res) + ' minutes: ' +
+                      repr(gap_stats), file=sys.stderr)
 
     # print to a csv file
     try:
-        printArray(data_5, files_lst, args.output_file+'_5.csv', args.sort_key)
+        printArray(data_5, files_lst, args.output_file+'_5.csv', args.sort_key,
+                   stats=stats, output_format=args.output_format,
+                   missing=args.missing, grid_res=5 if args.grid else None)
     except IndexError:
         print("sort_key provided was did not apply to the files in " +
               args.folder_name, file=sys.stderr)
         sys.exit(1)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
     try:
         printArray(data_15, files_lst, args.output_file +
-                   '_15.csv', args.sort_key)
+                   '_15.csv', args.sort_key, stats=stats,
+                   output_format=args.output_format, missing=args.missing,
+                   grid_res=15 if args.grid else None)
     except IndexError:
         print("sort_key provided did not apply to the files in " +
               args.folder_name, file=sys.stderr)
         sys.exit(1)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+    if stats is not None:
+        print(stats.summary(), file=sys.stderr)
@@ -3,6 +3,15 @@ import data_import
 import numpy as np
 import os
 import copy
+import shutil
+import io
+import contextlib
+import datetime
+import gzip
+import importlib.util
+import tracemalloc
+import subprocess
+import sys
 
 
 class TestImportData(unittest.TestCase):
@@ -77,11 +86,167 @@ class TestImportData(unittest.TestCase):
         assert csv_reader.linear_search_value(time_low) == [40.0]
         assert csv_reader.linear_search_value(time_normal) == [150.0]
 
+    def test_importdata_columnar_storage(self):
+        csv_reader = data_import.ImportData('smallData/smbg_small.csv')
+        assert csv_reader._time_array.dtype == np.dtype('datetime64[s]')
+        assert csv_reader._value_array.dtype == np.float64
+        assert csv_reader._time[0] == data_import.datetime.datetime(
+            2018, 3, 16, 8, 46)
+        assert csv_reader._value[0] == 254.0
+        assert csv_reader._value[:2] == [254.0, 82.0]
+
+    def test_importdata_views_read_only(self):
+        csv_reader = data_import.ImportData('smallData/smbg_small.csv')
+        with self.assertRaises(AttributeError):
+            csv_reader._value = []
+        with self.assertRaises(TypeError):
+            csv_reader._value[0] = 1.0
+
+    def test_hash_search_value(self):
+        csv_reader = data_import.ImportData('smallData/bolus_small.csv')
+        time_1 = data_import.datetime.datetime(2018, 3, 19, 18, 26)
+        assert csv_reader.hash_search_value(time_1) == [0.7]
+        assert csv_reader.hash_search_value(
+            data_import.datetime.datetime(2000, 1, 1)) == -1
+        self.assertRaises(TypeError, csv_reader.hash_search_value, 10)
+
+    def test_hash_search_values_bulk(self):
+        csv_reader = data_import.ImportData('testfile.csv')
+        time_1 = data_import.datetime.datetime(2012, 12, 12, 0, 0)
+        time_2 = data_import.datetime.datetime(2012, 12, 12, 0, 1)
+        hits = csv_reader.hash_search_values([time_1, time_2])
+        assert len(hits[0]) == 1000
+        assert len(hits[1]) == 0
+        hits = csv_reader.hash_search_values(
+            np.array([time_2, time_1], dtype='datetime64[s]'))
+        assert len(hits[0]) == 0
+        assert len(hits[1]) == 1000
+
+    def test_hash_index_invalidated_on_modify(self):
+        csv_reader = data_import.ImportData('smallData/bolus_small.csv')
+        time_1 = data_import.datetime.datetime(2018, 3, 19, 18, 26)
+        rounded = data_import.datetime.datetime(2018, 3, 19, 18, 30)
+        assert csv_reader.hash_search_value(rounded) == -1
+        data_import.roundTimeArray(csv_reader, 15, 'sum', modify=True)
+        assert csv_reader.hash_search_value(time_1) == -1
+        assert csv_reader.hash_search_value(rounded) == [0.7]
+
+    def test_sort_data_keeps_values_aligned(self):
+        csv_reader = data_import.ImportData('smallData/basal_small.csv')
+        pairs = sorted(zip(csv_reader._time, csv_reader._value),
+                       key=lambda pair: pair[0])
+        csv_reader.sort_data()
+        assert list(zip(csv_reader._time, csv_reader._value)) == pairs
+        time, value = pairs[3]
+        assert value in csv_reader.binary_search_value(time)
+
+    def test_binary_search_unsorted(self):
+        csv_reader = data_import.ImportData('smallData/basal_small.csv')
+        time_1 = data_import.datetime.datetime(2018, 3, 20, 3, 0)
+        assert csv_reader.binary_search_value(time_1) == \
+            csv_reader.linear_search_value(time_1)
+
+    def test_range_search_value(self):
+        csv_reader = data_import.ImportData('smallData/basal_small.csv')
+        dt = data_import.datetime.datetime
+        times, values = csv_reader.range_search_value(
+            dt(2018, 3, 20, 0, 0), dt(2018, 3, 21, 0, 0))
+        expected = sorted(
+            (time, value) for time, value in
+            zip(csv_reader._time, csv_reader._value)
+            if dt(2018, 3, 20) <= time < dt(2018, 3, 21))
+        assert len(expected) > 0
+        assert list(zip(times.tolist(), values.tolist())) == expected
+        windows = csv_reader.range_search_values(
+            [dt(2018, 3, 20), dt(2000, 1, 1)],
+            [dt(2018, 3, 21), dt(2000, 1, 2)])
+        assert len(windows[0][0]) == len(expected)
+        assert len(windows[1][0]) == 0
+
+    def test_nearest_value(self):
+        csv_reader = data_import.ImportData('test_highlow.csv', highlow=True)
+        dt = data_import.datetime.datetime
+        query = dt(2018, 3, 16, 0, 20, 30)
+        assert csv_reader.nearest_before_value(query) == \
+            (dt(2018, 3, 16, 0, 20), 300.0)
+        assert csv_reader.nearest_after_value(query) == \
+            (dt(2018, 3, 16, 0, 21), 40.0)
+        assert csv_reader.nearest_before_value(dt(2018, 3, 16)) is None
+        assert csv_reader.nearest_after_value(
+            query, tolerance=data_import.datetime.timedelta(seconds=10)) \
+            is None
+
+    def test_nearest_values_batched(self):
+        csv_reader = data_import.ImportData('test_highlow.csv', highlow=True)
+        dt = data_import.datetime.datetime
+        times, values = csv_reader.nearest_before_values(
+            [dt(2018, 3, 16, 0, 21), dt(2018, 3, 16), dt(2019, 1, 1)])
+        assert times[0] == np.datetime64('2018-03-16T00:21')
+        assert np.isnat(times[1])
+        assert values.tolist()[0] == 40.0
+        assert np.isnan(values[1])
+        assert values[2] == 150.0
+
     def test_linear_search_incorrect_time_format(self):
         csv_reader = data_import.ImportData('smallData/smbg_small.csv')
         self.assertRaises(TypeError, csv_reader.linear_search_value, 10)
 
 
+class TestParseTimeArray(unittest.TestCase):
+    def test_detect_time_format(self):
+        assert data_import.detectTimeFormat(
+            ['', '3/16/18 0:20']) == '%m/%d/%y %H:%M'
+        assert data_import.detectTimeFormat(
+            ['2018-03-16 00:20:00']) == '%Y-%m-%d %H:%M:%S'
+        assert data_import.detectTimeFormat(['not a time']) is None
+
+    def test_parse_time_array_fixed_format(self):
+        times = data_import.parseTimeArray(
+            ['3/16/18 0:20', '12/31/99 23:59'], '%m/%d/%y %H:%M')
+        assert times.dtype == np.dtype('datetime64[s]')
+        assert times[0] == np.datetime64('2018-03-16T00:20')
+        assert times[1] == np.datetime64('1999-12-31T23:59')
+
+    def test_parse_time_array_two_digit_years(self):
+        # the fast path must give the dates dateutil gave before it
+        import dateutil.parser
+        strings = ['1/1/%02d 0:00' % year for year in range(100)]
+        times = data_import.parseTimeArray(strings, '%m/%d/%y %H:%M')
+        expected = [np.datetime64(dateutil.parser.parse(string), 's')
+                    for string in strings]
+        np.testing.assert_array_equal(times, expected)
+
+    def test_parse_time_array_fallback(self):
+        times = data_import.parseTimeArray(
+            ['3/16/18 0:20', 'March 3 2018 10:00', '2/30/18 0:00', 'bad'])
+        assert times[0] == np.datetime64('2018-03-16T00:20')
+        assert times[1] == np.datetime64('2018-03-03T10:00')
+        assert np.isnat(times[2])
+        assert np.isnat(times[3])
+
+    def test_parse_time_array_bad_format(self):
+        self.assertRaises(ValueError, data_import.parseTimeArray,
+                          ['3/16/18'], '%m/%d/%y %I')
+        self.assertRaises(ValueError, data_import.ImportData,
+                          'smallData/smbg_small.csv', time_format='%Y%m%d')
+
+    def test_importdata_verbose_bad_rows(self):
+        with open('test_badrows.csv', 'w') as f:
+            f.write('id,time,value\n')
+            f.write('1,3/16/18 0:20,140\n')
+            f.write('2,not a time,145\n')
+            f.write('3,3/16/18 0:30,oops\n')
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            csv_reader = data_import.ImportData('test_badrows.csv',
+                                                verbose=True)
+        os.remove('test_badrows.csv')
+        assert csv_reader._value == [140.0]
+        assert out.getvalue().split('\n') == [
+            'Bad input format for time, skipping value', 'not a time',
+            'Bad input format for value, skipping value', 'oops', '']
+
+
 class TestRoundTimeArray(unittest.TestCase):
     def setUp(self):
         with open('test_timeround.csv', 'w') as f:
@@ -123,6 +288,93 @@ class TestRoundTimeArray(unittest.TestCase):
             assert time_round == data_import.datetime.datetime(
                 2018, 3, 16, 0, 0)
 
+    def test_roundtimearray_tie_rule(self):
+        with open('test_ties.csv', 'w') as f:
+            f.write('id,time,value\n')
+            f.write('1,3/16/18 0:23,1\n')
+            f.write('2,3/16/18 0:22,2\n')
+            f.write('3,3/16/18 0:05,4\n')
+            f.write('4,3/16/18 0:58,8\n')
+        csv_reader = data_import.ImportData('test_ties.csv')
+        os.remove('test_ties.csv')
+        pairs = list(data_import.roundTimeArray(csv_reader, 5, 'sum'))
+        dt = data_import.datetime.datetime
+        assert pairs == [(dt(2018, 3, 16, 0, 25), 1.0),
+                         (dt(2018, 3, 16, 0, 20), 2.0),
+                         (dt(2018, 3, 16, 0, 5), 4.0),
+                         (dt(2018, 3, 16, 1, 0), 8.0)]
+        pairs = list(data_import.roundTimeArray(csv_reader, 10, 'sum'))
+        assert pairs[1] == (dt(2018, 3, 16, 0, 0), 4.0)
+
+    def test_roundtimearray_matches_reference(self):
+        csv_reader = data_import.ImportData('smallData/cgm_small.csv')
+        expected = {}
+        for time, value in zip(csv_reader._time, csv_reader._value):
+            offset = time.minute % 15
+            if offset <= 15 / 2:
+                time = time - data_import.datetime.timedelta(minutes=offset)
+            else:
+                time = time + data_import.datetime.timedelta(
+                    minutes=15 - offset)
+            expected.setdefault(time, []).append(value)
+        pairs = list(data_import.roundTimeArray(csv_reader, 15, 'average'))
+        assert [pair[0] for pair in pairs] == list(expected)
+        for time, value in pairs:
+            np.testing.assert_almost_equal(value, np.average(expected[time]))
+
+    def test_roundtimearray_bad_res(self):
+        csv_reader = data_import.ImportData('test_timeround.csv')
+        self.assertRaises(ValueError, data_import.roundTimeArray,
+                          csv_reader, 0)
+
+    def test_roundtimearrays_matches_roundtimearray(self):
+        csv_reader = data_import.ImportData('smallData/hr_small.csv')
+        resolutions = [15, 1, 5, 60, 7]
+        for operation in ['average', 'sum']:
+            levels = data_import.roundTimeArrays(csv_reader, resolutions,
+                                                 operation)
+            assert len(levels) == len(resolutions)
+            for res, level in zip(resolutions, levels):
+                full = list(data_import.roundTimeArray(csv_reader, res,
+                                                       operation))
+                level = list(level)
+                assert [pair[0] for pair in level] == \
+                    [pair[0] for pair in full]
+                np.testing.assert_allclose([pair[1] for pair in level],
+                                           [pair[1] for pair in full])
+
+    def test_roundtimearrays_wrong_inputs(self):
+        csv_reader = data_import.ImportData('test_timeround.csv')
+        self.assertRaises(TypeError, data_import.roundTimeArrays,
+                          'string!', [5])
+        self.assertRaises(TypeError, data_import.roundTimeArrays,
+                          csv_reader, 5)
+        self.assertRaises(ValueError, data_import.roundTimeArrays,
+                          csv_reader, [5, 0])
+        self.assertRaises(NotImplementedError, data_import.roundTimeArrays,
+                          csv_reader, [5], 'divide')
+
+    def test_roundtimearray_leaves_source_untouched(self):
+        csv_reader = data_import.ImportData('smallData/basal_small.csv')
+        times = csv_reader._time_array
+        values = csv_reader._value_array
+        for search_type in ['linear', 'binary']:
+            data_import.roundTimeArray(csv_reader, 15, 'sum',
+                                       search_type=search_type)
+            assert csv_reader._time_array is times
+            assert csv_reader._value_array is values
+
+    def test_importdata_copy_on_write(self):
+        csv_reader = data_import.ImportData('test_timeround.csv')
+        with self.assertRaises(ValueError):
+            csv_reader._value_array[0] = 1.0
+        csv_copy = copy.deepcopy(csv_reader)
+        assert np.shares_memory(csv_copy._value_array,
+                                csv_reader._value_array)
+        data_import.roundTimeArray(csv_copy, 60, 'sum', modify=True)
+        assert len(csv_copy._time) == 1
+        assert csv_reader._value == [140.0, 145.0, 150.0]
+
     def test_roundtimearray_test_modify(self):
         csv_reader = data_import.ImportData('test_timeround.csv')
         csv_reader_old = copy.deepcopy(csv_reader)
@@ -131,6 +383,712 @@ class TestRoundTimeArray(unittest.TestCase):
         assert len(csv_reader._time) != len(csv_reader_old._time)
 
 
+class TestPartitionedData(unittest.TestCase):
+    def setUp(self):
+        with open('test_patients.csv', 'w', encoding='utf-8-sig') as f:
+            f.write('patient,time,value\n')
+            f.write('2,3/16/18 0:10,20\n')
+            f.write('1,3/16/18 0:20,12\n')
+            f.write('2,3/16/18 0:05,21\n')
+            f.write('1,3/16/18 0:00,10\n')
+            f.write(',3/16/18 0:00,99\n')
+            f.write('1,3/16/18 0:10,oops\n')
+            f.write('10,3/16/18 0:15,30\n')
+            f.write('1,3/16/18 0:10,11\n')
+
+    def tearDown(self):
+        os.remove('test_patients.csv')
+
+    def test_partition_and_query(self):
+        dt = datetime.datetime
+        data = data_import.PartitionedData('test_patients.csv')
+        assert data.ids == ['1', '10', '2']
+        assert len(data) == 3 and 10 in data and '3' not in data
+        assert list(data.query('1')) == [
+            (dt(2018, 3, 16, 0, 0), 10.0), (dt(2018, 3, 16, 0, 10), 11.0),
+            (dt(2018, 3, 16, 0, 20), 12.0)]
+        assert list(data.query(2, dt(2018, 3, 16, 0, 6))) == [
+            (dt(2018, 3, 16, 0, 10), 20.0)]
+        assert list(data.query(1, dt(2018, 3, 16, 0, 5),
+                               dt(2018, 3, 16, 0, 20))) == [
+            (dt(2018, 3, 16, 0, 10), 11.0)]
+        assert len(data.query(1, dt(2018, 3, 16, 1), dt(2018, 3, 16))) == 0
+        rounded = data_import.roundTimeArray(data.series('2'), 15)
+        assert list(rounded) == [(dt(2018, 3, 16, 0, 0), 21.0),
+                                 (dt(2018, 3, 16, 0, 15), 20.0)]
+        self.assertRaises(KeyError, data.query, '3')
+        self.assertRaises(KeyError, data_import.PartitionedData,
+                          'test_patients.csv', 'Id')
+
+    def test_partition_save_load(self):
+        data = data_import.PartitionedData('test_patients.csv')
+        data.save('test_patients.npz')
+        loaded = data_import.PartitionedData.load('test_patients.npz')
+        assert loaded.ids == data.ids
+        assert isinstance(loaded.times, np.memmap)
+        assert loaded.query('10') == data.query('10')
+        del loaded
+        os.remove('test_patients.npz')
+
+    def test_partition_small_data(self):
+        data = data_import.PartitionedData('smallData/hr_small.csv')
+        csv_reader = data_import.ImportData('smallData/hr_small.csv')
+        assert data.ids == ['52122']
+        assert sorted(data.query(52122)) == \
+            sorted(zip(csv_reader._time, csv_reader._value))
+
+
+class TestTimeSeries(unittest.TestCase):
+    def test_timeseries_sequence(self):
+        csv_reader = data_import.ImportData('smallData/hr_small.csv')
+        series = data_import.roundTimeArray(csv_reader, 5)
+        assert isinstance(series, data_import.TimeSeries)
+        pairs = list(series)
+        assert list(series) == pairs
+        assert len(series) == len(pairs)
+        assert series[3] == pairs[3]
+        assert isinstance(series[3][0], datetime.datetime)
+        assert list(series[10:20]) == pairs[10:20]
+        assert series[10:20].times.base is not None
+        assert not hasattr(series, '__dict__')
+        assert data_import.TimeSeries(*zip(*pairs)) == series
+        self.assertRaises(ValueError, data_import.TimeSeries,
+                          series.times, series.values[1:])
+
+    def test_timeseries_memory(self):
+        csv_reader = data_import.ImportData('smallData/hr_small.csv')
+        times = csv_reader._time_array
+        values = csv_reader._value_array
+        tracemalloc.start()
+        series = data_import.TimeSeries(times.copy(), values.copy())
+        compact = tracemalloc.get_traced_memory()[0]
+        pairs = list(zip(times.tolist(), values.tolist()))
+        boxed = tracemalloc.get_traced_memory()[0] - compact
+        tracemalloc.stop()
+        assert len(series) == len(pairs)
+        assert boxed >= 5 * compact
+
+
+class TestFillGaps(unittest.TestCase):
+    def setUp(self):
+        dt = datetime.datetime
+        self.series = data_import.TimeSeries(
+            [dt(2018, 1, 1, 0, 0), dt(2018, 1, 1, 0, 5),
+             dt(2018, 1, 1, 0, 20), dt(2018, 1, 1, 0, 50),
+             dt(2018, 1, 1, 0, 55)], [1.0, 2.0, 5.0, 10.0, 20.0])
+
+    def test_fill_gaps_strategies(self):
+        nan = float('nan')
+        expected = {
+            'nan': [1, 2, nan, nan, 5] + [nan] * 5 + [10, 20],
+            'ffill': [1, 2, 2, 2, 5] + [nan] * 5 + [10, 20],
+            'linear': [1, 2, 3, 4, 5] + [nan] * 5 + [10, 20],
+        }
+        for strategy, values in expected.items():
+            filled, stats = data_import.fillGaps(self.series, 5, strategy,
+                                                 max_gap=15)
+            np.testing.assert_array_equal(filled.values, values)
+            assert filled.times[1] - filled.times[0] == np.timedelta64(300)
+            assert (stats.expected, stats.observed, stats.missing) == \
+                (12, 5, 7)
+            assert (stats.gaps, stats.longest_gap) == (2, 25)
+        filled, stats = data_import.fillGaps(self.series, 5, 'linear')
+        np.testing.assert_allclose(filled.values[5:10],
+                                   5 + np.arange(1, 6) * 5 / 6.)
+        assert stats.filled == 7
+
+    def test_fill_gaps_window_and_errors(self):
+        dt = datetime.datetime
+        filled, stats = data_import.fillGaps(
+            self.series, 5, 'ffill', start=dt(2017, 12, 31, 23, 50),
+            end=dt(2018, 1, 1, 0, 10))
+        np.testing.assert_array_equal(filled.values, [np.nan, np.nan, 1, 2, 2])
+        assert stats.filled == 1
+        # readings whose seconds vary land in their buckets
+        seconds = data_import.TimeSeries(
+            [dt(2018, 1, 1, 0, 0, 42), dt(2018, 1, 1, 0, 15, 17),
+             dt(2018, 1, 1, 0, 45, 5)], [1.0, 2.0, 4.0])
+        filled, stats = data_import.fillGaps(seconds, 15, 'ffill')
+        assert data_import.formatTimeArray(filled.times) == [
+            '2018-01-01 00:00:00', '2018-01-01 00:15:00',
+            '2018-01-01 00:30:00', '2018-01-01 00:45:00']
+        np.testing.assert_array_equal(filled.values, [1, 2, 2, 4])
+        assert (stats.observed, stats.filled) == (3, 1)
+        self.assertRaises(ValueError, data_import.fillGaps, self.series, 7)
+        self.assertRaises(ValueError, data_import.fillGaps, self.series, 5,
+                          'mean')
+        self.assertRaises(ValueError, data_import.fillGaps, self.series, 5,
+                          'ffill', -5)
+        self.assertRaises(TypeError, data_import.fillGaps, self.series, 5.0)
+
+    def test_printarray_missing(self):
+        key = data_import.TimeSeries(self.series.times, self.series.values)
+        other = data_import.TimeSeries(self.series.times[:2], [7.0, 8.0])
+        data_import.printArray([key, other], ['key_small', 'other_small'],
+                               'test_missing.csv', 'key_small',
+                               missing='')
+        with open('test_missing.csv') as f:
+            lines = f.read().split('\n')
+        os.remove('test_missing.csv')
+        assert lines[2] == '2018-01-01 00:05:00,2.0,8.0,'
+        assert lines[3] == '2018-01-01 00:20:00,5.0,,'
+
+
+class TestRollingStats(unittest.TestCase):
+    def test_rolling_matches_brute_force(self):
+        csv_reader = data_import.ImportData('smallData/cgm_small.csv',
+                                            highlow=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = data_import.rollingStats(
+                csv_reader, [60, 1440], list(data_import.ROLLING_STATS))
+        times = results[60]['mean'].times.astype(np.int64)
+        values = np.array(sorted(zip(csv_reader._time,
+                                     csv_reader._value)))[:, 1]
+        values = values.astype(np.float64)
+        for window, columns in results.items():
+            for i in range(0, len(times), 50):
+                rows = np.flatnonzero(times[:i + 1] > times[i] - window * 60)
+                part = values[rows]
+                expected = {
+                    'mean': part.mean(), 'std': part.std(),
+                    'min': part.min(), 'max': part.max(),
+                    'count': len(part),
+                    'time_in_range': 100 * np.mean((part >= 70) &
+                                                   (part <= 180)),
+                }
+                for stat, value in expected.items():
+                    assert np.isclose(columns[stat].values[i], value)
+                if rows[0] < i:
+                    assert np.isclose(
+                        columns['rate_of_change'].values[i],
+                        (values[i] - values[rows[0]]) /
+                        ((times[i] - times[rows[0]]) / 60))
+
+    def test_rolling_nan_and_single_window(self):
+        dt = datetime.datetime
+        series = data_import.TimeSeries(
+            [dt(2018, 1, 1, 0, 10), dt(2018, 1, 1, 0, 0),
+             dt(2018, 1, 1, 0, 5), dt(2018, 1, 1, 0, 15)],
+            [30.0, 10.0, float('nan'), 20.0])
+        columns = data_import.rollingStats(
+            series, 10, ['mean', 'min', 'max', 'count', 'rate_of_change'])
+        assert list(columns['mean'].times) == sorted(series.times.tolist())
+        np.testing.assert_array_equal(columns['mean'].values,
+                                      [10, 10, 30, 25])
+        np.testing.assert_array_equal(columns['min'].values,
+                                      [10, 10, 30, 20])
+        np.testing.assert_array_equal(columns['max'].values,
+                                      [10, 10, 30, 30])
+        np.testing.assert_array_equal(columns['count'].values, [1, 1, 1, 2])
+        np.testing.assert_array_equal(columns['rate_of_change'].values,
+                                      [np.nan, np.nan, np.nan, -2.0])
+        self.assertRaises(ValueError, data_import.rollingStats, series, 0)
+        self.assertRaises(TypeError, data_import.rollingStats, series, 1.5)
+        self.assertRaises(ValueError, data_import.rollingStats, series, 5,
+                          ['median'])
+
+
+class TestAggregations(unittest.TestCase):
+    def setUp(self):
+        self.csv_reader = data_import.ImportData('smallData/hr_small.csv')
+        self.buckets = {}
+        for time, value in zip(self.csv_reader._time,
+                               self.csv_reader._value):
+            offset = time.minute % 15
+            if offset <= 15 / 2:
+                time = time - data_import.datetime.timedelta(minutes=offset)
+            else:
+                time = time + data_import.datetime.timedelta(
+                    minutes=15 - offset)
+            self.buckets.setdefault(time, []).append(value)
+
+    def check(self, operation, reference):
+        pairs = list(data_import.roundTimeArray(self.csv_reader, 15,
+                                                operation))
+        assert [pair[0] for pair in pairs] == list(self.buckets)
+        np.testing.assert_allclose(
+            [pair[1] for pair in pairs],
+            [reference(values) for values in self.buckets.values()])
+
+    def test_builtin_aggregations(self):
+        self.check('min', min)
+        self.check('max', max)
+        self.check('count', len)
+        self.check('first', lambda values: values[0])
+        self.check('last', lambda values: values[-1])
+        self.check('median', np.median)
+        self.check('p90', lambda values: np.percentile(values, 90))
+        self.check('p2.5', lambda values: np.percentile(values, 2.5))
+        self.check('add', sum)
+
+    def test_several_aggregations(self):
+        zip_objs = data_import.roundTimeArray(self.csv_reader, 15,
+                                              ['min', 'average', 'max'])
+        low, mean, high = [list(zip_obj) for zip_obj in zip_objs]
+        assert [pair[0] for pair in low] == list(self.buckets)
+        assert all(a[1] <= b[1] <= c[1] for a, b, c in zip(low, mean, high))
+        self.assertRaises(ValueError, data_import.roundTimeArray,
+                          self.csv_reader, 15, ['min', 'max'], True)
+
+    def test_register_aggregation(self):
+        spread = data_import.Aggregation(
+            lambda values, starts, counts:
+            np.maximum.reduceat(values, starts) -
+            np.minimum.reduceat(values, starts))
+        data_import.registerAggregation('spread', spread)
+        self.check('spread', lambda values: max(values) - min(values))
+        del data_import.AGGREGATIONS['spread']
+        self.assertRaises(TypeError, data_import.registerAggregation,
+                          'spread', max)
+        self.assertRaises(ValueError, data_import.Aggregation,
+                          max, ['median'], max)
+
+    def test_partial_aggregations(self):
+        for operation in ['min', 'max', 'count', 'median']:
+            levels = data_import.roundTimeArrays(self.csv_reader, [5, 15],
+                                                 operation)
+            assert list(levels[1]) == list(data_import.roundTimeArray(
+                self.csv_reader, 15, operation))
+        chunks = data_import.ImportData.iter_chunks(
+            'smallData/hr_small.csv', chunk_size=1000)
+        assert list(data_import.roundTimeChunks(chunks, 15, 'max')) == \
+            list(data_import.roundTimeArray(self.csv_reader, 15, 'max'))
+        self.assertRaises(NotImplementedError, data_import.roundTimeChunks,
+                          [], 15, 'median')
+        self.assertRaises(ValueError, data_import.percentileAggregation, 101)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_iter_chunks_matches_import(self):
+        csv_reader = data_import.ImportData('smallData/cgm_small.csv',
+                                            highlow=True)
+        chunks = list(data_import.ImportData.iter_chunks(
+            'smallData/cgm_small.csv', chunk_size=100, highlow=True))
+        assert len(chunks) == 12
+        times = np.concatenate([chunk[0] for chunk in chunks])
+        values = np.concatenate([chunk[1] for chunk in chunks])
+        np.testing.assert_array_equal(times, csv_reader._time_array)
+        np.testing.assert_array_equal(values, csv_reader._value_array)
+
+    def test_iter_chunks_skip_empty(self):
+        chunks = data_import.ImportData.iter_chunks(
+            'smallData/smbg_small.csv', chunk_size=4)
+        assert sum(len(values) for times, values in chunks) == 13
+
+    def test_iter_chunks_bad_input(self):
+        self.assertRaises(FileNotFoundError,
+                          data_import.ImportData.iter_chunks, 'not_a_file')
+        self.assertRaises(ValueError, data_import.ImportData.iter_chunks,
+                          'smallData/smbg_small.csv', 0)
+
+    def test_roundtimechunks_matches_roundtimearray(self):
+        csv_reader = data_import.ImportData('smallData/hr_small.csv')
+        for operation in ['average', 'sum']:
+            chunks = data_import.ImportData.iter_chunks(
+                'smallData/hr_small.csv', chunk_size=1000)
+            streamed = list(data_import.roundTimeChunks(chunks, 5,
+                                                        operation))
+            full = list(data_import.roundTimeArray(csv_reader, 5,
+                                                   operation))
+            assert [pair[0] for pair in streamed] == \
+                [pair[0] for pair in full]
+            np.testing.assert_allclose([pair[1] for pair in streamed],
+                                       [pair[1] for pair in full])
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = 'test_cache_dir'
+        shutil.copy('smallData/cgm_small.csv', 'test_cache.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.remove('test_cache.csv')
+
+    def test_cache_round_trip(self):
+        parsed = data_import.ImportData('test_cache.csv', highlow=True,
+                                        cache_dir=self.cache_dir)
+        assert len(os.listdir(self.cache_dir)) == 2
+        cached = data_import.ImportData('test_cache.csv', highlow=True,
+                                        cache_dir=self.cache_dir)
+        assert isinstance(cached._time_array.base, np.memmap)
+        np.testing.assert_array_equal(parsed._time_array,
+                                      cached._time_array)
+        np.testing.assert_array_equal(parsed._value_array,
+                                      cached._value_array)
+        # a different option is a different entry
+        data_import.ImportData('test_cache.csv', cache_dir=self.cache_dir)
+        assert len(os.listdir(self.cache_dir)) == 4
+
+    def test_cache_invalidated_by_change(self):
+        data_import.ImportData('test_cache.csv', cache_dir=self.cache_dir)
+        with open('test_cache.csv', 'a') as f:
+            f.write('\n2000,3/20/18 0:00,99\n')
+        stat = os.stat('test_cache.csv')
+        os.utime('test_cache.csv', ns=(stat.st_atime_ns,
+                                       stat.st_mtime_ns + 10**9))
+        csv_reader = data_import.ImportData('test_cache.csv',
+                                            cache_dir=self.cache_dir)
+        assert csv_reader._value[-1] == 99.0
+
+    def test_cache_eviction(self):
+        data_import.ImportData('test_cache.csv', cache_dir=self.cache_dir,
+                               cache_max_bytes=0)
+        assert os.listdir(self.cache_dir) == []
+
+
+class TestLazyImportData(unittest.TestCase):
+    def setUp(self):
+        shutil.copy('smallData/hr_small.csv', 'test_lazy.csv')
+
+    def tearDown(self):
+        for name in ['test_lazy.csv', 'test_lazy.csv.idx.npz']:
+            if os.path.exists(name):
+                os.remove(name)
+
+    def test_load_range_matches_full_import(self):
+        lazy = data_import.LazyImportData('test_lazy.csv', block_rows=1000)
+        assert len(lazy.starts) == 30
+        full = data_import.ImportData('test_lazy.csv')
+        dt = data_import.datetime.datetime
+        for start, end in [(dt(2018, 3, 17), dt(2018, 3, 17, 12)),
+                           (dt(2000, 1, 1), dt(2000, 1, 2)),
+                           (dt(2000, 1, 1), dt(2030, 1, 2))]:
+            part = lazy.load_range(start, end)
+            times, values = full.range_search_value(start, end)
+            assert sorted(zip(part._time, part._value)) == \
+                sorted(zip(times.tolist(), values.tolist()))
+
+    def test_index_persisted(self):
+        data_import.LazyImportData('test_lazy.csv', block_rows=1000)
+        assert os.path.exists('test_lazy.csv.idx.npz')
+        lazy = data_import.LazyImportData('test_lazy.csv', block_rows=1000)
+        assert lazy._load_index()
+        with open('test_lazy.csv', 'a') as f:
+            f.write('\n52122,3/21/18 0:00,70\n')
+        lazy = data_import.LazyImportData('test_lazy.csv', block_rows=1000)
+        assert lazy.max_times.max() == np.datetime64('2018-03-21T00:00')
+
+    def test_index_parses_only_times(self):
+        with open('test_lazy.csv', 'w') as f:
+            f.write('id,time,value\n1,3/16/18 0:20,high\n' +
+                    '2,3/16/18 0:25,oops\n')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            lazy = data_import.LazyImportData('test_lazy.csv', highlow=True,
+                                              verbose=True, persist=False)
+        # the row with a bad value still bounds its block
+        assert output.getvalue() == ''
+        assert lazy.max_times[0] == np.datetime64('2018-03-16T00:25')
+        with contextlib.redirect_stdout(output):
+            part = lazy.load_range(data_import.datetime.datetime(2018, 3, 16),
+                                   data_import.datetime.datetime(2018, 3, 17))
+        assert part._value == [300.0]
+        assert 'Changed high entry to 300' in output.getvalue()
+
+    def test_lazy_bad_input(self):
+        self.assertRaises(ValueError, data_import.LazyImportData,
+                          'test_lazy.csv', block_rows=0)
+        lazy = data_import.LazyImportData('test_lazy.csv', persist=False)
+        self.assertRaises(TypeError, lazy.load_range, 1, 2)
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.names = ['test_live_cgm.csv', 'test_live_bolus.csv']
+        self.tails = []
+        for name, source in zip(self.names, ['smallData/cgm_small.csv',
+                                             'smallData/bolus_small.csv']):
+            with open(source, 'r') as f:
+                lines = f.read().splitlines()
+            half = len(lines) // 2
+            with open(name, 'w') as f:
+                f.write('\n'.join(lines[:half]) + '\n')
+            self.tails.append('\n'.join(lines[half:]) + '\n')
+
+    def tearDown(self):
+        for name in self.names + ['test_live_out.csv', 'test_full_out.csv']:
+            if os.path.exists(name):
+                os.remove(name)
+
+    def test_append(self):
+        csv_reader = data_import.ImportData(self.names[0])
+        n_rows = len(csv_reader._time)
+        dt = data_import.datetime.datetime
+        csv_reader.append([dt(2019, 1, 1), dt(2019, 1, 2)], [1.0, 2.0])
+        csv_reader.append([dt(2019, 1, 3)], [3.0])
+        assert len(csv_reader._value) == n_rows + 3
+        assert csv_reader._value[-3:] == [1.0, 2.0, 3.0]
+        assert csv_reader.hash_search_value(dt(2019, 1, 3)) == [3.0]
+
+    def test_append_csv_partial_line(self):
+        csv_reader = data_import.ImportData(self.names[0])
+        n_rows = len(csv_reader._time)
+        with open(self.names[0], 'a') as f:
+            f.write('5000,3/20/18 0:00,99\n5001,3/20/18 0:0')
+        times, values = csv_reader.append_csv()
+        assert values.tolist() == [99.0]
+        with open(self.names[0], 'a') as f:
+            f.write('5,100\n')
+        times, values = csv_reader.append_csv()
+        assert values.tolist() == [100.0]
+        assert len(csv_reader._time) == n_rows + 2
+
+    def test_constructor_partial_line(self):
+        dt = datetime.datetime
+        name = 'test_live_partial.csv'
+        with open(name, 'w') as f:
+            f.write('id,time,value\n1,3/16/18 0:00,10\n2,3/16/18 0:1')
+        csv_reader = data_import.ImportData(name)
+        assert csv_reader._value == [10.0]
+        with open(name, 'a') as f:
+            f.write('0,20\n3,3/16/18 0:20,3')
+        times, values = csv_reader.append_csv()
+        assert values.tolist() == [20.0]
+        assert csv_reader._value == [10.0, 20.0]
+        # a cut off value is kept until its line is complete
+        csv_reader = data_import.ImportData(name)
+        assert csv_reader._value == [10.0, 20.0, 3.0]
+        with open(name, 'a') as f:
+            f.write('0\n')
+        times, values = csv_reader.append_csv()
+        assert values.tolist() == [30.0]
+        assert csv_reader._value == [10.0, 20.0, 30.0]
+        assert list(csv_reader._time) == [
+            dt(2018, 3, 16, 0, 0), dt(2018, 3, 16, 0, 10),
+            dt(2018, 3, 16, 0, 20)]
+        os.remove(name)
+
+    def test_incremental_round(self):
+        csv_reader = data_import.ImportData(self.names[0])
+        live = data_import.IncrementalRound(csv_reader, 15)
+        with open(self.names[0], 'a') as f:
+            f.write(self.tails[0])
+        changed, is_new = live.update(*csv_reader.append_csv())
+        assert len(changed) > 0
+        assert is_new.any()
+        full = data_import.ImportData(self.names[0])
+        assert list(live.result()) == list(data_import.roundTimeArray(
+            full, 15, 'average'))
+        self.assertRaises(NotImplementedError, data_import.IncrementalRound,
+                          full, 15, 'median')
+
+    def test_incremental_merge_matches_printarray(self):
+        data = [data_import.ImportData(name) for name in self.names]
+        merge = data_import.IncrementalMerge(
+            data, self.names, 'test_live_out.csv', 'cgm', 5,
+            ['average', 'sum'])
+        for name, tail in zip(self.names, self.tails):
+            with open(name, 'a') as f:
+                f.write(tail)
+        written = merge.update_from_csv()
+        assert written > 0
+        assert merge.update_from_csv() == 0
+        full = [data_import.ImportData(name) for name in self.names]
+        data_import.printArray(
+            [data_import.roundTimeArray(full[0], 5, 'average'),
+             data_import.roundTimeArray(full[1], 5, 'sum')],
+            self.names, 'test_full_out.csv', 'cgm')
+        with open('test_live_out.csv') as f:
+            live = f.read()
+        with open('test_full_out.csv') as f:
+            assert live == f.read()
+        assert written < len(live.splitlines())
+
+    def test_incremental_merge_unterminated_seed(self):
+        # the seed files end in the middle of a value, like a feed that
+        # is being written, smallData files have no final newline either
+        for name, tail in zip(self.names, self.tails):
+            with open(name, 'r') as f:
+                seed = f.read()
+            with open(name, 'w') as f:
+                f.write(seed[:-2])
+            with open(name + '.tail', 'w') as f:
+                f.write(seed[-2:] + tail)
+        data = [data_import.ImportData(name) for name in self.names]
+        merge = data_import.IncrementalMerge(
+            data, self.names, 'test_live_out.csv', 'cgm', 5,
+            ['average', 'sum'])
+        for name in self.names:
+            with open(name + '.tail') as f:
+                tail = f.read()
+            os.remove(name + '.tail')
+            with open(name, 'a') as f:
+                f.write(tail)
+        merge.update_from_csv()
+        full = [data_import.ImportData(name) for name in self.names]
+        data_import.printArray(
+            [data_import.roundTimeArray(full[0], 5, 'average'),
+             data_import.roundTimeArray(full[1], 5, 'sum')],
+            self.names, 'test_full_out.csv', 'cgm')
+        with open('test_live_out.csv') as f:
+            live = f.read()
+        with open('test_full_out.csv') as f:
+            assert live == f.read()
+
+
+class TestImportFolder(unittest.TestCase):
+    def test_importfolder_parallel_matches_serial(self):
+        files_1, rounded_1 = data_import.importFolder('smallData', [5, 15])
+        files_2, rounded_2 = data_import.importFolder('smallData', [5, 15],
+                                                      jobs=2)
+        assert files_1 == files_2
+        assert len(rounded_1) == 2
+        for level_1, level_2 in zip(rounded_1, rounded_2):
+            for series_1, series_2 in zip(level_1, level_2):
+                times_1, values_1 = zip(*series_1)
+                times_2, values_2 = zip(*series_2)
+                assert times_1 == times_2
+                # activity_small.csv has nan values
+                np.testing.assert_array_equal(values_1, values_2)
+
+    def test_importfolder_bad_input(self):
+        self.assertRaises(ValueError, data_import.importFolder,
+                          'smallData', [5], 0)
+        self.assertRaises(FileNotFoundError, data_import.importFolder,
+                          'not_a_folder')
+
+
+class TestProcessFolders(unittest.TestCase):
+    def setUp(self):
+        shutil.copytree('smallData', 'test_batch/patient_1')
+        os.makedirs('test_batch/patient_2')
+        shutil.copy('smallData/hr_small.csv', 'test_batch/patient_2')
+
+    def tearDown(self):
+        shutil.rmtree('test_batch')
+        shutil.rmtree('test_batch_out', ignore_errors=True)
+
+    def test_process_folders_report(self):
+        report = data_import.processFolders(
+            ['test_batch/patient_*', 'test_batch/missing'],
+            'test_batch_out', 'cgm_small', jobs=1, max_folders=2)
+        assert [entry['folder'] for entry in report] == [
+            'test_batch/patient_1', 'test_batch/patient_2',
+            'test_batch/missing']
+        assert report[0]['error'] is None
+        assert report[0]['outputs'] == ['test_batch_out/patient_1_5.csv',
+                                        'test_batch_out/patient_1_15.csv']
+        assert report[1]['error'].startswith('IndexError')
+        assert report[2]['error'].startswith('FileNotFoundError')
+
+        files_lst, (data_5, data_15) = data_import.importFolder(
+            'test_batch/patient_1')
+        data_import.printArray(data_5, files_lst, 'test_batch_out/serial',
+                               'cgm_small')
+        with open('test_batch_out/serial.csv') as f:
+            serial = f.read()
+        with open('test_batch_out/patient_1_5.csv') as f:
+            assert f.read() == serial
+
+    def test_process_folders_cache_and_stats(self):
+        for jobs, hits in [(2, 0), (1, 7)]:
+            stats = data_import.PipelineStats()
+            report = data_import.processFolders(
+                ['test_batch/patient_1'], 'test_batch_out', 'cgm_small',
+                jobs=jobs, cache_dir='test_batch_out/cache', stats=stats)
+            assert report[0]['error'] is None
+            assert stats.counts['cache_hits'] == hits
+            assert stats.counts['rows_written'] > 0
+        assert len(os.listdir('test_batch_out/cache')) == 14
+
+    def test_process_folders_fill_gaps_and_grid(self):
+        report = data_import.processFolders(
+            ['test_batch/patient_1'], 'test_batch_out', 'cgm_small',
+            resolutions=[15], jobs=1, fill_gaps='ffill', missing='',
+            grid=True)
+        files_lst, (data_15,) = data_import.importFolder(
+            'test_batch/patient_1', [15])
+        gaps = data_import._fill_folder_gaps(files_lst, data_15, 15,
+                                             'ffill', None)
+        assert [(name, repr(gap_stats)) for name, res, gap_stats in
+                report[0]['gaps']] == [(name, repr(gap_stats))
+                                       for name, gap_stats in gaps]
+        data_import.printArray(data_15, files_lst, 'test_batch_out/serial',
+                               'cgm_small', missing='', grid_res=15)
+        with open('test_batch_out/serial.csv') as f:
+            serial = f.read()
+        with open('test_batch_out/patient_1_15.csv') as f:
+            assert f.read() == serial
+
+    def test_process_folders_bad_input(self):
+        self.assertRaises(TypeError, data_import.processFolders,
+                          'test_batch', 'test_batch_out', 'cgm_small')
+        self.assertRaises(ValueError, data_import.processFolders,
+                          ['test_batch/patient_1'], 'test_batch_out',
+                          'cgm_small', max_folders=0)
+        self.assertRaises(ValueError, data_import.processFolders,
+                          ['test_batch/patient_1', 'smallData/../'
+                           'test_batch/patient_1'], 'test_batch_out',
+                          'cgm_small')
+
+
+class TestPipelineStats(unittest.TestCase):
+    def test_stats_counts(self):
+        with open('test_stats.csv', 'w') as f:
+            f.write('id,time,value\n')
+            f.write('1,3/16/18 0:20,high\n')
+            f.write('2,3/16/18 0:21,low\n')
+            f.write('3,not a time,145\n')
+            f.write('4,3/16/18 0:30,oops\n')
+            f.write('5,3/16/18 0:35,\n')
+            f.write('6,3/16/18 0:40,150\n')
+        events = []
+        stats = data_import.PipelineStats(
+            callback=lambda stage, seconds: events.append(stage))
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = data_import.ImportData('test_stats.csv', highlow=True,
+                                          stats=stats)
+        data_import.roundTimeArray(data, 15, stats=stats)
+        size = os.path.getsize('test_stats.csv')
+        os.remove('test_stats.csv')
+        assert stats.counts['rows_parsed'] == 3
+        assert stats.counts['rows_empty'] == 1
+        assert stats.counts['bad_time'] == 1
+        assert stats.counts['bad_value'] == 1
+        assert stats.counts['high_substituted'] == 1
+        assert stats.counts['low_substituted'] == 1
+        assert stats.counts['bytes_read'] == size
+        for stage in ['read', 'parse_time', 'parse_value', 'round']:
+            assert stage in stats.timings
+            assert stage in events
+        assert 'round' in stats.summary()
+
+    def test_stats_printarray_and_jobs(self):
+        serial = data_import.PipelineStats()
+        files_lst, (data_5,) = data_import.importFolder(
+            'smallData', [5], stats=serial)
+        parallel = data_import.PipelineStats()
+        data_import.importFolder('smallData', [5], jobs=2, stats=parallel)
+        assert parallel.counts == serial.counts
+        assert parallel.calls == serial.calls
+        data_import.printArray(data_5, files_lst, 'test_stats_out.csv',
+                               'cgm_small', stats=serial)
+        size = os.path.getsize('test_stats_out.csv')
+        os.remove('test_stats_out.csv')
+        assert serial.counts['bytes_written'] == size
+        assert serial.calls['align'] == serial.calls['write'] == 1
+        assert serial.counts['rows_written'] > 0
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_is_light(self):
+        # a fresh interpreter, this one has imported numpy already
+        code = ('import sys, data_import\n'
+                'heavy = ["numpy", "dateutil", "asyncio", "argparse",\n'
+                '         "concurrent.futures", "csv", "zipfile"]\n'
+                'print(" ".join(m for m in heavy if m in sys.modules))\n'
+                'data_import.parseTimeArray(["3/16/18 0:00"])\n'
+                'print(type(data_import.np).__name__)\n'
+                'print("dateutil" in sys.modules)\n')
+        output = subprocess.run([sys.executable, '-c', code],
+                                stdout=subprocess.PIPE, check=True,
+                                cwd=os.path.dirname(
+                                    os.path.abspath(__file__)))
+        assert output.stdout.decode().split('\n') == [
+            '', 'module', 'False', '']
+
+
 class TestPrintArray(unittest.TestCase):
     def test_printarray_bolus_cgm(self):
         bolus_data = data_import.ImportData('smallData/bolus_small.csv')
@@ -147,6 +1105,140 @@ class TestPrintArray(unittest.TestCase):
             assert 'time,cgm,bolus' in f.readline()
             assert '2018-03-16 00:00:00,144.5,0.7,' in f.readline()
 
+    def test_alignarray_merge(self):
+        dt = data_import.datetime.datetime
+        key = zip([dt(2018, 1, 1, 0, 0), dt(2018, 1, 1, 0, 5),
+                   dt(2018, 1, 1, 0, 5)], [1.0, 2.0, 3.0])
+        other = zip([dt(2018, 1, 1, 0, 5), dt(2018, 1, 1, 0, 5),
+                     dt(2017, 1, 1)], [20.0, 30.0, 40.0])
+        aligned = data_import.alignArray(
+            [other, key], ['dir/other_small.csv', 'dir/key_small.csv'],
+            'key_small')
+        assert aligned.names == ['key', 'other']
+        assert aligned.values.tolist() == [
+            [1.0, 0.0], [2.0, 20.0], [3.0, 20.0]]
+        assert aligned.found[:, 1].tolist() == [False, True, True]
+        assert aligned.format_columns()[2] == ['0', '20.0', '20.0']
+
+    def test_printarray_format_options(self):
+        cgm_data = data_import.ImportData('smallData/cgm_small.csv')
+        bolus_data = data_import.ImportData('smallData/bolus_small.csv')
+        data_list = [data_import.roundTimeArray(cgm_data, 60, 'average'),
+                     data_import.roundTimeArray(bolus_data, 60, 'sum')]
+        data_import.printArray(data_list, ['cgm_small', 'bolus_small'],
+                               'test_printarray', 'cgm_small',
+                               float_precision=2,
+                               time_format='%m/%d/%y %H:%M', compress=True)
+        with gzip.open('test_printarray.csv.gz', 'rt') as f:
+            assert f.readline() == 'time,cgm,bolus,\n'
+            assert f.readline() == '03/16/18 00:00,144.50,0.70,\n'
+        os.remove('test_printarray.csv.gz')
+
+    def binary_round_trip(self, output_format, mmap_mode='r'):
+        files_lst, (data_5,) = data_import.importFolder('smallData', [5])
+        data_import.printArray(data_5, files_lst, 'test_binary.csv',
+                               'cgm_small')
+        files_lst, (data_5,) = data_import.importFolder('smallData', [5])
+        data_import.printArray(data_5, files_lst, 'test_binary.csv',
+                               'cgm_small', output_format=output_format)
+        file_name = 'test_binary.' + output_format
+        aligned = data_import.loadArray(file_name, mmap_mode)
+        with open('test_binary.csv', 'r') as f:
+            f.readline()
+            assert aligned.format_text() == f.read()
+        os.remove('test_binary.csv')
+        return aligned, file_name
+
+    def test_printarray_npz(self):
+        aligned, file_name = self.binary_round_trip('npz')
+        assert isinstance(aligned.values, np.memmap)
+        assert aligned.times.dtype == np.dtype('datetime64[s]')
+        assert aligned.names[0] == 'cgm'
+        del aligned
+        aligned, file_name = self.binary_round_trip('npz', None)
+        assert not isinstance(aligned.values, np.memmap)
+        os.remove(file_name)
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'),
+                         'pyarrow is not installed')
+    def test_printarray_arrow(self):
+        aligned, file_name = self.binary_round_trip('arrow')
+        os.remove(file_name)
+
+    def test_printarray_output_format_errors(self):
+        cgm_data = data_import.ImportData('smallData/cgm_small.csv')
+        self.assertRaises(ValueError, data_import.printArray,
+                          [data_import.roundTimeArray(cgm_data, 60)],
+                          ['cgm_small'], 'test_binary', 'cgm_small',
+                          output_format='xlsx')
+        self.assertRaises(ValueError, data_import.printArray,
+                          [data_import.roundTimeArray(cgm_data, 60)],
+                          ['cgm_small'], 'test_binary', 'cgm_small',
+                          output_format='npz', compress=True)
+
+    def test_format_time_array(self):
+        times = data_import.parseTimeArray(
+            ['3/16/18 0:05', '12/1/19 13:45', '1/2/03 9:00'])
+        assert data_import.formatTimeArray(times) == [
+            '2018-03-16 00:05:00', '2019-12-01 13:45:00',
+            '2003-01-02 09:00:00']
+        text = data_import.formatTimeArray(times, '%Y/%m/%d %H:%M:%S')
+        assert text[1] == '2019/12/01 13:45:00'
+        np.testing.assert_array_equal(
+            data_import.parseTimeArray(text, '%Y/%m/%d %H:%M:%S'), times)
+        self.assertRaises(ValueError, data_import.formatTimeArray,
+                          times, '%m/%d %I')
+
+    def test_resamplearray_grid(self):
+        dt = datetime.datetime
+        key = data_import.TimeSeries(
+            [dt(2018, 1, 1, 0, 10), dt(2018, 1, 1, 0, 5)], [1.0, 2.0])
+        other = data_import.TimeSeries(
+            [dt(2018, 1, 1, 0, 20), dt(2018, 1, 1, 0, 0)], [3.0, 4.0])
+        aligned = data_import.resampleArray(
+            [other, key], ['dir/other_small.csv', 'dir/key_small.csv'], 5,
+            'key_small')
+        assert aligned.names == ['key', 'other']
+        assert data_import.formatTimeArray(aligned.times)[::4] == [
+            '2018-01-01 00:00:00', '2018-01-01 00:20:00']
+        np.testing.assert_array_equal(aligned.values, [
+            [np.nan, 4.0], [2.0, np.nan], [1.0, np.nan], [np.nan, np.nan],
+            [np.nan, 3.0]])
+        assert aligned.found.sum() == 4
+        aligned = data_import.resampleArray(
+            [other, key], ['other', 'key'], 5, start=dt(2018, 1, 1, 0, 5),
+            end=dt(2018, 1, 1, 0, 10))
+        assert aligned.names == ['other', 'key']
+        np.testing.assert_array_equal(aligned.values,
+                                      [[np.nan, 2.0], [np.nan, 1.0]])
+        # rounded times keep their seconds
+        seconds = data_import.TimeSeries(
+            [dt(2018, 1, 1, 0, 5, 17), dt(2018, 1, 1, 0, 15, 42)],
+            [5.0, 6.0])
+        aligned = data_import.resampleArray(
+            [seconds, key], ['seconds', 'key'], 5)
+        assert data_import.formatTimeArray(aligned.times) == [
+            '2018-01-01 00:05:00', '2018-01-01 00:10:00',
+            '2018-01-01 00:15:00']
+        np.testing.assert_array_equal(aligned.values, [
+            [5.0, 2.0], [np.nan, 1.0], [6.0, np.nan]])
+        self.assertRaises(IndexError, data_import.resampleArray,
+                          [other, key], ['other', 'key'], 5, 'cgm')
+        self.assertRaises(ValueError, data_import.resampleArray,
+                          [other, key], ['other', 'key'], 7)
+
+    def test_printarray_grid(self):
+        files_lst, (data_15,) = data_import.importFolder('smallData', [15])
+        data_import.printArray(data_15, files_lst, 'test_grid.csv',
+                               'cgm_small', grid_res=15)
+        with open('test_grid.csv') as f:
+            lines = f.read().split('\n')
+        os.remove('test_grid.csv')
+        assert lines[0].startswith('time,cgm,')
+        times = np.array([line.split(',')[0] for line in lines[1:-1]],
+                         dtype='datetime64[s]')
+        assert (np.diff(times) == np.timedelta64(15 * 60, 's')).all()
+
     def test_printarray_input_types(self):
         bolus_data = data_import.ImportData('smallData/bolus_small.csv')
         cgm_data = data_import.ImportData('smallData/cgm_small.csv')
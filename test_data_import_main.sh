@@ -17,4 +17,41 @@ assert_exit_code 0
 assert_no_stdout
 
 run test_csv_out cat data_out_5.csv
-assert_in_stdout 2018-03-16 00:05:00,151
\ No newline at end of file
+assert_in_stdout 2018-03-16 00:05:00,151
+
+run test_data_import_jobs python data_import.py --folder_name smallData --output_file data_out_jobs --sort_key cgm_small --jobs 2
+assert_exit_code 0
+assert_no_stdout
+
+run test_csv_out_jobs cmp data_out_5.csv data_out_jobs_5.csv
+assert_exit_code 0
+
+run test_data_import_profile python data_import.py --folder_name smallData --output_file data_out_profile --sort_key cgm_small --profile
+assert_exit_code 0
+assert_no_stdout
+assert_in_stderr rows_parsed
+
+run test_data_import_batch python data_import.py --folders smallData not_a_folder --output_dir data_out_batch --sort_key cgm_small
+assert_exit_code 1
+assert_no_stdout
+assert_in_stderr "1 of 2 folders processed"
+
+run test_csv_out_batch cmp data_out_5.csv data_out_batch/smallData_5.csv
+assert_exit_code 0
+
+run test_data_import_module python -m data_import --folder_name smallData --output_file data_out_module --sort_key cgm_small
+assert_exit_code 0
+assert_no_stdout
+
+run test_csv_out_module cmp data_out_5.csv data_out_module_5.csv
+assert_exit_code 0
+
+run test_data_import_batch_profile python data_import.py --folders smallData --output_dir data_out_batch --sort_key cgm_small --profile --cache_dir data_out_batch/cache
+assert_exit_code 0
+assert_no_stdout
+assert_in_stderr rows_parsed
+
+run test_data_import_batch_fill_gaps python data_import.py --folders smallData --output_dir data_out_batch_fill --sort_key cgm_small --fill_gaps ffill --missing NA
+assert_exit_code 0
+assert_no_stdout
+assert_in_stderr GapStats